@@ -2,13 +2,21 @@ from git import Repo
 import os, sys
 from parse import *
 from jira import JIRA, JIRAError
-import re
-import itertools
-from jira_cache import CachedIssues
 import time
-from datetime import datetime
 import multiprocessing as mp
-import pandas as pd
+import gc
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.compact_issue_store import load_cached_issues
+from common.jira_sync import sync_issues
+from common.commit_table import CommitTable
+from common.refactorings import RefactoringIndex
+from common.diff_cache import DiffCache
+from common.blame import BACKENDS as BLAME_BACKENDS
+from common.blame_memo import BlameMemo, shared_counters, format_counters
+from common.unified_diff import parse_diff
+from common.unit_filters import FilterSet, shared_filter_counters, format_filter_counters
+from common.task_schedule import changed_paths, file_affinity_tasks, merge_results
+from common.issue_links import load_issue_links
 from graph_tool.all import *
 import pickle
 
@@ -23,29 +31,71 @@ OUTPUTS_DIR = "outputs/"
 
 JIRA_DIR = "jira/"
 
+# pull the issues updated since the last run before labeling
+SYNC_JIRA = False
+
+# bugfix diffs are cached on disk, shared by all SZZ variants
+DIFF_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "diff_cache")
+DIFF_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# git log -L / git blame options of the blame step
+BLAME_OPTIONS = ('--no-merges', '--ignore-cr-at-eol', '--ignore-space-at-eol', '--ignore-blank-lines',
+                 '--ignore-space-change')
+
+# how lines are blamed: "log" runs git log -L per hunk, "blame" runs git blame --porcelain per file,
+# "index" looks lines up in a line origin index kept up to date before every run
+BLAME_BACKEND = "log"
+
+# git processes a worker runs at once to blame a commit, see BlameMemo.prefetch; 1 runs each
+# query when its result is needed
+BLAME_CONCURRENCY = 1
+
+# "commit" makes every bugfix commit one pool task, "file" every file it changes, with the tasks of
+# a file next to each other so that a worker keeps to one file's history (see file_affinity_tasks)
+TASK_SCHEDULE = "commit"
+
+# blame results of earlier runs and other workers, see BlameMemo
+BLAME_MEMO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "blame_memo")
+BLAME_MEMO_MAX_BYTES = 512 * 1024 ** 2
+
+# file and line unit filters by name, applied in this order, see common/unit_filters.py
+FILE_FILTERS = ["testfiles", "filetypes"]
+LINE_FILTERS = ["comments", "blank_lines", "imports", "context", "refactor_changes"]
+
+# diff only the files the file filters keep by their path, with git pathspecs (see
+# FilterSet.diff_pathspecs); the filters still run on the diff
+PUSH_DOWN_FILE_FILTERS = True
+
+def init_worker(repo_path, issues, commits, refactorings, blame_counters, filter_counters):
+    # runs once per pool worker: under fork the arguments are inherited, under spawn they are
+    # pickled once per worker instead of once per task. Each worker opens its own Repo, so tasks
+    # only carry the sha of the bugfix commit
+    global REPO, ISSUES, COMMITS, JIRA_KEYS, DIFF_CACHE, BLAME, REFACTORINGS, FU_FILTERS, LU_FILTERS
+    REPO = Repo(repo_path)
+    ISSUES = issues
+    COMMITS = commits
+    # commits missing from the table are read through this worker's repo, not the parent's
+    COMMITS.repo = REPO
+    JIRA_KEYS = commits.jira_keys
+    DIFF_CACHE = DiffCache(DIFF_CACHE_DIR, DIFF_CACHE_MAX_BYTES)
+    BLAME = BlameMemo(BLAME_BACKENDS[BLAME_BACKEND](REPO, COMMITS, BLAME_OPTIONS), BLAME_MEMO_DIR,
+                      BLAME_MEMO_MAX_BYTES, counters=blame_counters)
+    # the filters of this run, compiled once
+    FU_FILTERS = FilterSet(FILE_FILTERS, filter_counters)
+    LU_FILTERS = FilterSet(LINE_FILTERS, filter_counters)
+    REFACTORINGS = refactorings
+
 def get_jira_id(commit):
-    result = re.search('('+repo_name.upper()+'[-,_]{1}[0-9]+|HADOOP[-,_]{1}[0-9]+)', commit.message, re.IGNORECASE)
-    if result is not None:
-        return result.group(0).replace("_", "-", 1)
-    else:
-        return None
+    # the keys of all commits are extracted up front, see JiraKeyIndex
+    return JIRA_KEYS.key_of(commit)
 
-def get_jira_issue(commit, lock=None):
+def get_jira_issue(commit):
     global ISSUES
 
     jira_id = get_jira_id(commit=commit)
     if jira_id is not None:
-        if lock is not None:
-            lock.acquire()
-            jira_issues = [issue for issue in ISSUES if issue.key == jira_id]
-            lock.release()
-        else:
-            jira_issues = [issue for issue in ISSUES if issue.key == jira_id]
-        # if the resulting list isn't empty
-        if jira_issues:
-            return jira_issues[0]
-        else:
-            return None
+        # ISSUES is read-only, so workers can look it up without any locking
+        return ISSUES.get(jira_id)
     else:
         return None
 
@@ -55,129 +105,58 @@ def get_commit_diff_string(commit, repo):
     try:
         # commit has parent
         if len(commit.parents) > 0:
-            commit_diff = repo.git.diff('--diff-filter=MRC', '--ignore-cr-at-eol', '--ignore-space-at-eol',
-                                        '--ignore-blank-lines', '--ignore-space-change',
-                                        commit_sha + '^', commit_sha)
+            # from the diff cache, or else this process' long-lived git diff-tree; git leaves out
+            # the files the file filters drop by their path, see PUSH_DOWN_FILE_FILTERS
+            pathspecs = FU_FILTERS.diff_pathspecs(repo, commit_sha, commit.parents[0].hexsha) \
+                if PUSH_DOWN_FILE_FILTERS else ()
+            commit_diff = DIFF_CACHE.diff(repo, commit_sha, commit.parents[0].hexsha,
+                                          '--diff-filter=MRC', '--ignore-cr-at-eol', '--ignore-space-at-eol',
+                                          '--ignore-blank-lines', '--ignore-space-change', *pathspecs)
         # commit has no parent
         else:
+            pathspecs = FU_FILTERS.diff_pathspecs(repo, commit_sha, None) if PUSH_DOWN_FILE_FILTERS else ()
             commit_diff = repo.git.diff('--diff-filter=MRC', '--ignore-cr-at-eol', '--ignore-space-at-eol',
                                         '--ignore-blank-lines', '--ignore-space-change',
-                                        commit_sha)
+                                        commit_sha, *pathspecs)
     except Exception as e:
         print(e)
     return commit_diff
 
 
-def gen_file_unit(diff):
-    pattern = r'(^---[\s\S]*?)(?=^diff)|(^---[\s\S]*)$'
-    compiled_pattern = re.compile(pattern=pattern, flags=re.MULTILINE)
-    for match in re.finditer(compiled_pattern, diff):
-        yield match.group(0) or match.group(1)
-
-def gen_change_unit(file_unit):
-    pattern = r'(^@@ [\s\S]*?)(?=^@@ )|(^@@ [\s\S]*)$'
-    compiled_pattern = re.compile(pattern=pattern, flags=re.MULTILINE)
-    for match in re.finditer(compiled_pattern, file_unit):
-        yield match.group(0) or match.group(1)
-
-def gen_line_unit(change_unit):
-    pattern = r'^(\d+.*)'
-    compiled_pattern = re.compile(pattern=pattern, flags=re.MULTILINE)
-    for match in re.finditer(compiled_pattern, change_unit):
-        yield match.group(0)
-
-
-def number_lines(matchobj, bugfix_revision):
-    #  number which denotes the starting line
-    if bugfix_revision:
-        start_line = int(matchobj.group(4))
-    else:
-        start_line = int(matchobj.group(2))
-    # this is the changed code
-    code = matchobj.group(6)
-    new_code_string = matchobj.group(1)
-    for line in code.split('\n'):
-        if line != '':
-            new_line = str(start_line) + ' ' + line
-            new_code_string = new_code_string + '\n' + new_line
-            start_line += 1
-    return new_code_string
-
 def parse_filename(file_unit, parent):
-    if parent:
-        pattern = r'\-\-\- a/(.*)'
-    else:
-        pattern = r'\+\+\+ b/(.*)'
-    compiled_pattern = re.compile(pattern=pattern)
-    if re.search(compiled_pattern, file_unit):
-        return re.search(compiled_pattern, file_unit).group(1)
-    else:
-        raise Exception("File name not found in this string:\n" + file_unit)
-
-def gen_change_type(change_units):
-    for change_unit in change_units:
-        added_lines_pattern = r'\n\+{1}.*'
-        added_lines_pattern = re.compile(pattern=added_lines_pattern)
-        removed_lines_pattern = r'\n-{1}.*'
-        removed_lines_pattern = re.compile(pattern=removed_lines_pattern)
-        if re.search(added_lines_pattern, change_unit) and re.search(removed_lines_pattern, change_unit):
-            yield 'm'
-        elif re.search(added_lines_pattern, change_unit):
-            yield 'a'
-        elif re.search(removed_lines_pattern, change_unit):
-            yield 'd'
-
-
-def gen_numbered_diffs(change_units, bugfix_revision):
-    for change_unit in change_units:
-        # print(change_unit)
-        pattern = r'(@@ -([\d]+),?([\d]*) \+([\d]+),?([\d]*) @@).*\n(([ \-+].*\n?)*)'
-        compiled_pattern = re.compile(pattern=pattern, flags=re.MULTILINE)
-        result = ''
-        for item in re.finditer(compiled_pattern, change_unit):
-            new_output_chunk = number_lines(item, bugfix_revision)
-            result = '\n' + new_output_chunk
-        # print(result)
-        yield result
-
-
-def gen_blamed_commits(lines_to_blame, commit_sha, filename, refactorings, repo):
-    for startLine, offset in lines_to_blame:
-        lines = list(range(startLine,startLine+offset))
-        for l in lines:
-            log_string = repo.git.log('--no-merges', '--ignore-cr-at-eol', '--ignore-space-at-eol',
-                                      '--ignore-blank-lines', '--ignore-space-change',
-                                      '-L ' + str(l) + ',' + str(l) + ':' + filename,
-                                      str(commit_sha))
-            pattern = r'^commit ([\w\d]{40})'
-            compiled_pattern = re.compile(pattern, re.MULTILINE)
-            shas = re.findall(compiled_pattern, log_string)
-
-            for blame_commit_sha in shas:
-                # don't include first match if that's the bugfix commit itself!
-                if blame_commit_sha == commit_sha:
-                    continue
-                # filter refactor changes
-                if not is_refactor([l], blame_commit_sha, filename, refactorings=refactorings):
-                    # if the blamed commit was found, yield and return
-                    b_commit = repo.commit(rev=blame_commit_sha)
+    filename = file_unit.old_path if parent else file_unit.new_path
+    if filename is None:
+        raise Exception("File name not found in this string:\n" + file_unit.text)
+    return filename
+
+def gen_blamed_commits(lines_to_blame, commit_sha, filename, refactorings, repo, creation):
+    # the history of every line to blame, newest commit first (see BLAME_BACKEND)
+    for l, shas in BLAME.file_histories(lines_to_blame, filename, commit_sha):
+        for blame_commit_sha in shas:
+            # don't include first match if that's the bugfix commit itself!
+            if blame_commit_sha == commit_sha:
+                continue
+            # filter refactor changes
+            if not is_refactor([l], blame_commit_sha, filename, refactorings=refactorings):
+                # if the blamed commit was found, yield and return. Commits from after the creation
+                # of the bug report jira ticket are dropped by their date alone, without a commit object
+                if COMMITS.committed_before(blame_commit_sha, creation):
+                    b_commit = COMMITS.commit(blame_commit_sha)
                     yield b_commit
-                    break
+                break
 
 def is_refactor(lines, revision, file, refactorings):
-    candidates = refactorings[(refactorings.sha == revision) &
-                              (refactorings.file == file)]
-    l = [list(range(begin, end + 1)) for begin, end in zip(candidates.begin, candidates.end)]
-    l_flat = [item for sublist in l for item in sublist]
-    l_flat = set(l_flat)
-    # print("%s: %str: " % (file, str(l_flat)))
+    # refactorings is a RefactoringIndex; no refactored lines in revision/file means no refactoring
+    return refactorings.covers(lines, revision, file)
+
 
-    # because all([]) evaluates to true
-    if len(l_flat) == 0:
-        return False
+def sha_filter_has_jira(jira_keys):
+    # sha -> jira key of the commits whose jira issue is known
+    return {sha: key for sha, key in jira_keys.items() if key in ISSUES}
 
-    is_refactor = all(line_num in l_flat for line_num in lines)
-    return is_refactor
+
+def sha_filter_jira_type_is_bug(jira_shas):
+    return {sha: key for sha, key in jira_shas.items() if ISSUES[key].fields.issuetype.name == "Bug"}
 
 
 def commit_filter_has_jira(commits):
@@ -193,112 +172,12 @@ def commit_filter_jira_type_is_bug(commits):
             yield commit
 
 
-def commit_filter_committed_before_jira_creation(commits, creation):
-    for commit in commits:
-        commit_date_str = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(commit.committed_date))
-        commit_datetime = datetime.strptime(commit_date_str, '%Y-%m-%d %H:%M:%S')
-        if commit_datetime < creation:
-            yield commit
-
-def fu_filter_file_creation(file_units):
-    # filter out file units that contain file creation
-    # --- /dev/null
-    for file_unit in file_units:
-        pattern = r'--- /dev/null'
-        compiled_pattern = re.compile(pattern=pattern)
-        if not re.search(compiled_pattern, file_unit):
-            yield file_unit
-
-def fu_filter_testfiles(file_units):
-    # filter out testfiles
-    for file_unit in file_units:
-        pattern = r'--- .*/test/.*|--- .*/itests/.*|--- .*/testutils/.*'
-        compiled_pattern = re.compile(pattern=pattern)
-        if not re.search(compiled_pattern, file_unit):
-            yield file_unit
-
-def fu_filter_filetypes(file_units):
-    # leave files ending in .java, .g, .g4
-    for file_unit in file_units:
-        pattern = r'--- .*/.*\.java|--- .*/.*\.g|--- .*/.*\.g4'
-        compiled_pattern = re.compile(pattern=pattern)
-        if re.search(compiled_pattern, file_unit):
-            yield file_unit
-
-
-def cu_filter_lines_with_minus(change_units):
-    # take out lines starting with '-' prefix
-    for change_unit in change_units:
-        pattern = r'\n\-{1}.*'
-        compiled_pattern = re.compile(pattern=pattern, flags=re.MULTILINE)
-        yield re.sub(compiled_pattern, '', change_unit)
-
-def cu_filter_lines_with_plus(change_units):
-    # take out lines starting with '-' prefix
-    for change_unit in change_units:
-        pattern = r'\n\+{1}.*'
-        compiled_pattern = re.compile(pattern=pattern, flags=re.MULTILINE)
-        yield re.sub(compiled_pattern, '', change_unit)
-
-def lu_filter_comments(line_units):
-    # filter comments
-    for line in line_units:
-        pattern = r'\d+ [\+\- ] *\/\/.*|\d+ [\+\- ] *\/\*.*|\d+ [\+\- ] *\*.*'
-        compiled_pattern = re.compile(pattern=pattern)
-        if not re.search(compiled_pattern, line):
-            yield line
-
-
-def lu_filter_blank_lines(line_units):
-    # filter blank lines
-    for line in line_units:
-        pattern = r'\d+ [\+\- ] *$'
-        compiled_pattern = re.compile(pattern=pattern)
-        if not re.search(compiled_pattern, line):
-            yield line
-
-def lu_filter_imports(line_units):
-    # filter blank lines
-    for line in line_units:
-        pattern = r'\d+ [\+\- ]import.*'
-        compiled_pattern = re.compile(pattern=pattern)
-        if not re.search(compiled_pattern, line):
-            yield line
-
-
-def lu_filter_context(line_units):
-    for line in line_units:
-        pattern = r'\d+ [\+\-].*'
-        compiled_pattern = re.compile(pattern=pattern)
-        if re.search(compiled_pattern, line):
-            yield line
-
-def lu_filter_refactor_changes(line_units, revision, file, refactorings):
-    for line in line_units:
-        pattern = r'(\d+).*'
-        compiled_pattern = re.compile(pattern=pattern)
-        for match in re.finditer(compiled_pattern, line):
-            line_num = int(match.group(1))
-            if not is_refactor([line_num], revision, file, refactorings=refactorings):
-                yield line
-
-
-def get_line_num(line):
-    pattern = r'\d+'
-    compiled_pattern = re.compile(pattern=pattern)
-    if re.search(compiled_pattern, line):
-        return int(re.search(compiled_pattern, line).group(0))
-    else:
-        raise Exception("Number not found in: \n" + line)
-
-
 def collect_lines_to_blame(line_units):
     lines = []
     previous_num = None
     start_line = None
     plus_N = None
-    for line_unit in line_units:
-        line_num = get_line_num(line=line_unit)
+    for line_num in line_units.numbers:
         if not previous_num:
             previous_num = line_num
             start_line = line_num
@@ -327,36 +206,40 @@ def collect_lines_to_blame(line_units):
     return lines
 
 
-def get_jira_creation_datetime(commit, lock):
-    jira_issue = get_jira_issue(commit=commit, lock=lock)
-    created = jira_issue.fields.created
-    return datetime.strptime(created.split(".")[0], '%Y-%m-%dT%H:%M:%S')
+def get_jira_creation_epoch(commit):
+    # seconds since the epoch (utc), the issue store keeps "created" in milliseconds
+    return ISSUES.timestamp(get_jira_id(commit=commit), 'created') // 1000
 
 
-def get_blamed_shas(sha, repo, refactorings, lock):
+def get_blamed_shas(sha, paths=None):
+    repo, refactorings = REPO, REFACTORINGS
     print(mp.current_process())
     blamed_commits_all = []
+    # the blamed commits of every change unit, and the blame queries behind them
+    blame_jobs = []
+    blame_requests = []
 
     print("\n--- Processing commit (" + sha + ")")
-    commit = repo.commit(sha)
+    commit = COMMITS.commit(sha)
 
     # time of jira creation
-    creation = get_jira_creation_datetime(commit=commit, lock=lock)
+    creation = get_jira_creation_epoch(commit=commit)
 
     commit_diff = get_commit_diff_string(commit=commit, repo=repo)
 
     ###########################
     # FILE UNITS
     ###########################
-    file_units = gen_file_unit(diff=commit_diff)
+    # files, hunks and numbered lines, read in one pass over the diff
+    file_units = parse_diff(commit_diff)
 
     ###########################
     # FILE UNIT FILTERS
     ###########################
-    fu_filters = [fu_filter_testfiles,
-                  fu_filter_filetypes]
-    for f in fu_filters:
-        file_units = f(file_units=file_units)
+    file_units = FU_FILTERS.files(file_units)
+    if paths is not None:
+        # a task for some of the commit's files, see TASK_SCHEDULE
+        file_units = (file_unit for file_unit in file_units if parse_filename(file_unit, parent=False) in paths)
 
     for file_unit in file_units:
         # parse filename
@@ -366,52 +249,22 @@ def get_blamed_shas(sha, repo, refactorings, lock):
         ###########################
         # CHANGE UNITS
         ###########################
-        change_units = gen_change_unit(file_unit=file_unit)
-
-        change_units_copy, change_units = itertools.tee(change_units)
-        change_types = gen_change_type(change_units=change_units_copy)
-
-        change_units_bugfix, change_units_parent = itertools.tee(change_units)
-
-        ###########################
-        # CHANGE UNIT FILTERS
-        ###########################
-        cu_filters = [cu_filter_lines_with_minus]
-        for f in cu_filters:
-            change_units_bugfix = f(change_units=change_units_bugfix)
-
-        # number lines (new revision line numbers)
-        change_units_bugfix = gen_numbered_diffs(change_units=change_units_bugfix, bugfix_revision=True)
+        # the change type, parent side and bugfix side of every hunk, from one scan over its lines
+        change_units = [change_unit.sides() for change_unit in file_unit.hunks]
 
-        cu_filters = [cu_filter_lines_with_plus]
-        for f in cu_filters:
-            change_units_parent = f(change_units=change_units_parent)
-
-        # number lines (parent revision line numbers)
-        change_units_parent = gen_numbered_diffs(change_units=change_units_parent, bugfix_revision=False)
-
-        for change_unit in change_units_parent:
+        for change_type, parent_side, bugfix_side in change_units:
             ###########################
             # LINE UNITS
             ###########################
-            line_units = gen_line_unit(change_unit=change_unit)
+            line_units = parent_side
 
             ###########################
             # LINE UNIT FILTERS
             ###########################
-            lu_filters = [lu_filter_comments,
-                          lu_filter_blank_lines,
-                          lu_filter_imports,
-                          lu_filter_context]
-
-            for f in lu_filters:
-                line_units = f(line_units=line_units)
+            line_units = LU_FILTERS.lines(line_units, scope={'refactorings': refactorings, 'revision': sha,
+                                                             'file': parent_filename})
 
-            line_units = lu_filter_refactor_changes(line_units=line_units, revision=sha, file=parent_filename,
-                                                    refactorings=refactorings)
-
-            dummy, line_units = itertools.tee(line_units)
-            lines_to_blame = collect_lines_to_blame(line_units=dummy)
+            lines_to_blame = collect_lines_to_blame(line_units=line_units)
 
             ###########################
             # BLAME COMMITS
@@ -419,36 +272,28 @@ def get_blamed_shas(sha, repo, refactorings, lock):
 
             # get blamed commits, and also filter blamed commits that are refactors
             blamed_commits = gen_blamed_commits(lines_to_blame=lines_to_blame, commit_sha=sha + '^',
-                                                filename=parent_filename, refactorings=refactorings, repo=repo)
-
-            # filter out commits that were created after the creation of the bug report jira ticket
-            blamed_commits = commit_filter_committed_before_jira_creation(blamed_commits, creation)
+                                                filename=parent_filename, refactorings=refactorings, repo=repo,
+                                                creation=creation)
+            # read once the whole commit is known, see BLAME_CONCURRENCY
+            blame_requests.append((lines_to_blame, parent_filename, sha + '^'))
 
-            blamed_commits_all.extend([c.hexsha for c in blamed_commits])
+            blame_jobs.append(blamed_commits)
 
-        for change_unit, change_type in zip(change_units_bugfix, change_types):
+        for change_type, parent_side, bugfix_side in change_units:
             ###########################
             # LINE UNITS
             ###########################
-            line_units = gen_line_unit(change_unit=change_unit)
+            line_units = bugfix_side
 
             ###########################
             # LINE UNIT FILTERS
             ###########################
             # handle ONLY changes that are not additions!
             if change_type != 'a':
-                lu_filters = [lu_filter_comments,
-                              lu_filter_blank_lines,
-                              lu_filter_imports,
-                              lu_filter_context]
-
-                for f in lu_filters:
-                    line_units = f(line_units=line_units)
+                line_units = LU_FILTERS.lines(line_units, scope={'refactorings': refactorings, 'revision': sha,
+                                                                 'file': bugfix_filename})
 
-                line_units = lu_filter_refactor_changes(line_units=line_units, revision=sha, file=bugfix_filename, refactorings=refactorings)
-
-                dummy, line_units = itertools.tee(line_units)
-                lines_to_blame = collect_lines_to_blame(line_units=dummy)
+                lines_to_blame = collect_lines_to_blame(line_units=line_units)
 
                 ###########################
                 # BLAME COMMITS
@@ -456,10 +301,10 @@ def get_blamed_shas(sha, repo, refactorings, lock):
 
                 # get blamed commits, and also filter blamed commits that are refactors
                 blamed_commits = gen_blamed_commits(lines_to_blame=lines_to_blame, commit_sha=sha,
-                                                    filename=bugfix_filename, refactorings=refactorings, repo=repo)
-
-                # filter out commits that were created after the creation of the bug report jira ticket
-                blamed_commits = commit_filter_committed_before_jira_creation(blamed_commits, creation)
+                                                    filename=bugfix_filename, refactorings=refactorings, repo=repo,
+                                                    creation=creation)
+                # read once the whole commit is known, see BLAME_CONCURRENCY
+                blame_requests.append((lines_to_blame, bugfix_filename, sha))
 
                 ###########################
                 # BLAME COMMIT FILTERS
@@ -468,7 +313,14 @@ def get_blamed_shas(sha, repo, refactorings, lock):
                 for f in filters:
                     blamed_commits = f(blamed_commits)
 
-                blamed_commits_all.extend([c.hexsha for c in blamed_commits])
+                blame_jobs.append(blamed_commits)
+
+    # every blame query of the commit is known now; with BLAME_CONCURRENCY > 1 they all run up
+    # front, several at a time
+    if BLAME_CONCURRENCY > 1:
+        BLAME.prefetch(blame_requests, BLAME_CONCURRENCY)
+    for blamed_commits in blame_jobs:
+        blamed_commits_all.extend([c.hexsha for c in blamed_commits])
 
     blamed_commits_all = set(blamed_commits_all)
     return tuple([sha, blamed_commits_all])
@@ -488,14 +340,12 @@ def add_vertex_properties(v, commit):
     version_names = [version.name for version in fix_versions]
     v_properties['fixed_versions'][v] = ", ".join(version_names)
     v_properties['created_date'][v] = jira_issue.fields.created
+    v_properties['created_epoch'][v] = ISSUES.timestamp(jira_id, 'created')
 
     v_properties['sha'][v] = commit_sha
-    issue_links = jira_issue.fields.issuelinks
-    links = [link for link in issue_links if link.type.inward == "is caused by" or
-             link.type.inward == "is broken by"]
-    causes = [link.inwardIssue.key for link in links if "inwardIssue" in link.raw.keys()]
-    v_properties['caused_by'][v] = ", ".join(causes)
+    v_properties['caused_by'][v] = ", ".join(LINKS.caused_by(jira_id))
     v_properties['commit_date'][v] = commit.committed_datetime
+    v_properties['commit_epoch'][v] = commit.committed_date * 1000
 
 
 if __name__ == '__main__':
@@ -538,17 +388,16 @@ if __name__ == '__main__':
 
     # load issues
     jira_issue_path = jira_path + 'issue_cache.json'
-    if not os.path.isfile(jira_issue_path):
+    if SYNC_JIRA or not os.path.isfile(jira_issue_path):
         try:
-            ISSUES = jira.search_issues("project=" + repo_name.upper(), maxResults=False, fields="*all")
-            print("Issues loaded from server! Caching to file for later use...")
-            cached = CachedIssues(ISSUES)
-            cached.dump(open(jira_issue_path, 'w'))
+            # only fetches issues updated since the last sync, and picks up an interrupted sync where it stopped
+            sync_issues(jira, repo_name.upper(), jira_path)
+            print("Issues synced from server! Cached to file for later use...")
         except JIRAError as e:
             if e.status_code == 429:
                 print("Got 429 (rate-limited) response from server.")
                 print(e.text)
-                exit_msg = "Exiting " + time.asctime(time.localtime(time.time()))
+                exit_msg = "Exiting " + time.asctime(time.localtime(time.time())) + ", run again to resume the sync"
                 sys.exit(exit_msg)
             else:
                 print(e.text)
@@ -556,13 +405,13 @@ if __name__ == '__main__':
             print("Some other exception occured.")
             print(e)
 
-    else:
-        print("Load issues from cache.")
-        ISSUES = CachedIssues.load(open(jira_issue_path))
+    print("Load issues from cache.")
+    ISSUES = load_cached_issues(jira_path)
+    LINKS = load_issue_links(jira_path, ISSUES)
 
     # load refactorings
     print("Load refactorings")
-    REFACTORINGS = pd.read_csv("refactorings.csv")
+    REFACTORINGS = RefactoringIndex.load("refactorings.csv")
 
     # create graph (directed)
     g = Graph(directed=True)
@@ -579,28 +428,49 @@ if __name__ == '__main__':
     v_properties['created_date'] = g.new_vertex_property("string")
     v_properties['caused_by'] = g.new_vertex_property("string")
     v_properties['commit_date'] = g.new_vertex_property("string")
+    # epoch milliseconds (utc), so the evaluation can compare dates without parsing them
+    v_properties['created_epoch'] = g.new_vertex_property("int64_t")
+    v_properties['commit_epoch'] = g.new_vertex_property("int64_t")
 
     ###########################
     # COMMITS
     ###########################
-    commits = repo.iter_commits()
+    # sha, parents, dates, message and jira key of every commit, read in one pass over the history;
+    # later stages look commits up here instead of creating GitPython objects
+    print("Reading commits...")
+    COMMITS = CommitTable.build(repo, repo_name, output_dir_path + "jira_keys.csv")
+    JIRA_KEYS = COMMITS.jira_keys
+
+    if BLAME_BACKEND == "index":
+        # only the commits added since the last run are walked
+        print("Indexing line origins...")
+        print(BLAME_BACKENDS[BLAME_BACKEND](repo, COMMITS, BLAME_OPTIONS).index.update(), "commits indexed")
 
     ###########################
     # COMMIT FILTERS
     ###########################
-    commit_filters = [commit_filter_has_jira,
-                      commit_filter_jira_type_is_bug]
-    for f in commit_filters:
-        commits = f(commits=commits)
-
-    shas = [commit.hexsha for commit in commits]
-
-    m = mp.Manager()
-    lock = m.Lock()
-
-    args = zip(shas, [repo] * len(shas), [REFACTORINGS] * len(shas), [lock] * len(shas))
-    with mp.Pool(mp.cpu_count()) as p:
-        res = p.starmap(get_blamed_shas, args)
+    jira_shas = sha_filter_has_jira(JIRA_KEYS)
+    shas = list(sha_filter_jira_type_is_bug(jira_shas))
+
+    if TASK_SCHEDULE == "file":
+        tasks = file_affinity_tasks(COMMITS, shas, changed_paths(repo))
+        print(len(tasks), "file tasks")
+
+    # the issue index is built once here and inherited by the workers (copy-on-write under fork);
+    # freezing it keeps the workers' garbage collector from touching, and thereby copying, its pages
+    gc.freeze()
+
+    blame_counters = shared_counters()
+    filter_counters = shared_filter_counters()
+    worker_inputs = (cloned_repo_base_path, ISSUES, COMMITS, REFACTORINGS, blame_counters, filter_counters)
+    with mp.Pool(mp.cpu_count(), initializer=init_worker, initargs=worker_inputs) as p:
+        if TASK_SCHEDULE == "file":
+            # one result per commit again, in commit order
+            res = merge_results(shas, p.starmap(get_blamed_shas, tasks))
+        else:
+            res = p.map(get_blamed_shas, shas)
+    print(format_counters(blame_counters))
+    print(format_filter_counters(filter_counters))
 
     # filter None values
     res = list(filter(None, res))
@@ -614,7 +484,7 @@ if __name__ == '__main__':
     for item in res:
         print(item)
         commit_sha, blamed_shas = item[0], item[1]
-        commit = repo.commit(commit_sha)
+        commit = COMMITS.commit(commit_sha)
         if commit_sha not in stored_commits:
             v = g.add_vertex()
             add_vertex_properties(v=v, commit=commit)
@@ -622,7 +492,7 @@ if __name__ == '__main__':
         else:
             v = g.vertex(stored_commits.index(commit_sha))
         for blamed_commit_sha in blamed_shas:
-            b_commit = repo.commit(blamed_commit_sha)
+            b_commit = COMMITS.commit(blamed_commit_sha)
             has_jira = get_jira_issue(b_commit) is not None
             print("\t- Processing bug inducing commit (" + blamed_commit_sha + ")")
             if blamed_commit_sha not in stored_commits:
@@ -0,0 +1,176 @@
+"""
+Time to turn bugfix diffs into numbered parent and bugfix side lines: the chain of regex
+generators the SZZ scripts used (file units, change units, change types, the minus/plus
+stripped views, numbered diffs, line units, the numbers parsed back out of the text), kept here
+verbatim, against the single pass of common/unified_diff.py into line number arrays, one scan per
+side of each hunk or one for both (Hunk.sides). All results are checked to be identical.
+
+The diffs are those of the --diffs largest bugfix commits (by diff size), with the options of
+the scripts. Bugfix commits are the commits whose message mentions a key of --project (all
+commits without it).
+
+usage: python benchmarks/bench_diff_parser.py path/to/repo [--project HIVE] [--diffs 50] [--repeat 3]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+from git import Repo
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.commit_table import CommitTable
+from common.git_stream import GitStream
+from common.unified_diff import parse_diff
+
+
+def gen_file_unit(diff):
+    pattern = r'(^---[\s\S]*?)(?=^diff)|(^---[\s\S]*)$'
+    compiled_pattern = re.compile(pattern=pattern, flags=re.MULTILINE)
+    for match in re.finditer(compiled_pattern, diff):
+        yield match.group(0) or match.group(1)
+
+
+def gen_change_unit(file_unit):
+    pattern = r'(^@@ [\s\S]*?)(?=^@@ )|(^@@ [\s\S]*)$'
+    compiled_pattern = re.compile(pattern=pattern, flags=re.MULTILINE)
+    for match in re.finditer(compiled_pattern, file_unit):
+        yield match.group(0) or match.group(1)
+
+
+def gen_line_unit(change_unit):
+    pattern = r'^(\d+.*)'
+    compiled_pattern = re.compile(pattern=pattern, flags=re.MULTILINE)
+    for match in re.finditer(compiled_pattern, change_unit):
+        yield match.group(0)
+
+
+def number_lines(matchobj, bugfix_revision):
+    if bugfix_revision:
+        start_line = int(matchobj.group(4))
+    else:
+        start_line = int(matchobj.group(2))
+    code = matchobj.group(6)
+    new_code_string = matchobj.group(1)
+    for line in code.split('\n'):
+        if line != '':
+            new_line = str(start_line) + ' ' + line
+            new_code_string = new_code_string + '\n' + new_line
+            start_line += 1
+    return new_code_string
+
+
+def parse_filename(file_unit, parent):
+    pattern = r'\-\-\- a/(.*)' if parent else r'\+\+\+ b/(.*)'
+    match = re.search(re.compile(pattern=pattern), file_unit)
+    return match.group(1) if match else None
+
+
+def gen_change_type(change_units):
+    for change_unit in change_units:
+        added_lines_pattern = re.compile(pattern=r'\n\+{1}.*')
+        removed_lines_pattern = re.compile(pattern=r'\n-{1}.*')
+        if re.search(added_lines_pattern, change_unit) and re.search(removed_lines_pattern, change_unit):
+            yield 'm'
+        elif re.search(added_lines_pattern, change_unit):
+            yield 'a'
+        elif re.search(removed_lines_pattern, change_unit):
+            yield 'd'
+
+
+def gen_numbered_diffs(change_units, bugfix_revision):
+    for change_unit in change_units:
+        pattern = r'(@@ -([\d]+),?([\d]*) \+([\d]+),?([\d]*) @@).*\n(([ \-+].*\n?)*)'
+        compiled_pattern = re.compile(pattern=pattern, flags=re.MULTILINE)
+        result = ''
+        for item in re.finditer(compiled_pattern, change_unit):
+            new_output_chunk = number_lines(item, bugfix_revision)
+            result = '\n' + new_output_chunk
+        yield result
+
+
+def cu_filter_lines_with_minus(change_units):
+    for change_unit in change_units:
+        yield re.sub(re.compile(pattern=r'\n\-{1}.*', flags=re.MULTILINE), '', change_unit)
+
+
+def cu_filter_lines_with_plus(change_units):
+    for change_unit in change_units:
+        yield re.sub(re.compile(pattern=r'\n\+{1}.*', flags=re.MULTILINE), '', change_unit)
+
+
+def numbered_lines(change_unit):
+    # (line number, line) of the line units, the numbers read back as the scripts did
+    return [(int(line_unit.split(' ', 1)[0]), line_unit.split(' ', 1)[1]) for line_unit in gen_line_unit(change_unit)]
+
+
+def regex_chain(diff):
+    # (parent path, bugfix path, change types, parent side lines, bugfix side lines) of every file
+    files = []
+    for file_unit in gen_file_unit(diff):
+        change_units = list(gen_change_unit(file_unit))
+        change_types = list(gen_change_type(change_units))
+        parent = [numbered_lines(change_unit) for change_unit in
+                  gen_numbered_diffs(cu_filter_lines_with_plus(change_units), False)]
+        bugfix = [numbered_lines(change_unit) for change_unit in
+                  gen_numbered_diffs(cu_filter_lines_with_minus(change_units), True)]
+        files.append((parse_filename(file_unit, True), parse_filename(file_unit, False), change_types, parent,
+                      bugfix))
+    return files
+
+
+def side_lines(side):
+    return list(zip(side.numbers, side.lines))
+
+
+def single_pass(diff):
+    files = []
+    for file_diff in parse_diff(diff):
+        change_types = [hunk.change_type for hunk in file_diff.hunks if hunk.change_type is not None]
+        parent = [side_lines(hunk.parent_lines()) for hunk in file_diff.hunks]
+        bugfix = [side_lines(hunk.bugfix_lines()) for hunk in file_diff.hunks]
+        files.append((file_diff.old_path, file_diff.new_path, change_types, parent, bugfix))
+    return files
+
+
+def fused_sides(diff):
+    # both sides and the change type of every hunk from one scan over its lines, as the scripts read them
+    files = []
+    for file_diff in parse_diff(diff):
+        sides = [hunk.sides() for hunk in file_diff.hunks]
+        files.append((file_diff.old_path, file_diff.new_path,
+                      [change_type for change_type, _, _ in sides if change_type is not None],
+                      [side_lines(parent) for _, parent, _ in sides], [side_lines(bugfix) for _, _, bugfix in sides]))
+    return files
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("repo")
+    parser.add_argument("--project")
+    parser.add_argument("--diffs", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    repo = Repo(args.repo)
+    table = CommitTable.build(repo, args.project)
+    stream = GitStream.of(repo)
+    diffs = [stream.diff(sha, table.parents[table.rows[sha]][0], '--diff-filter=MRC') for sha in table
+             if len(table.parents[table.rows[sha]]) == 1 and (args.project is None or table.jira_key(sha) is not None)]
+    diffs = sorted(diffs, key=len, reverse=True)[:args.diffs]
+    n_bytes = sum(len(diff) for diff in diffs)
+    n_lines = sum(diff.count('\n') for diff in diffs)
+
+    print("%d diffs, %d lines, %.1f MB, largest %.1f MB" % (len(diffs), n_lines, n_bytes / 1024 ** 2,
+                                                            len(diffs[0]) / 1024 ** 2 if diffs else 0))
+    print("%-20s %10s %10s" % ("", "time [s]", "MB/s"))
+    results = {}
+    for name, parse in (("regex chain", regex_chain), ("single pass", single_pass), ("fused sides", fused_sides)):
+        elapsed = None
+        for _ in range(args.repeat):
+            start = time.time()
+            results[name] = [parse(diff) for diff in diffs]
+            elapsed = min(elapsed, time.time() - start) if elapsed is not None else time.time() - start
+        print("%-20s %10.3f %10.1f" % (name, elapsed, n_bytes / 1024 ** 2 / elapsed))
+    assert results["regex chain"] == results["single pass"] == results["fused sides"]
@@ -0,0 +1,72 @@
+"""
+Checks that the git pathspecs the file filters are pushed down into (FilterSet.diff_pathspecs)
+leave the scripts the same file units as the filters alone, and times both: each bugfix diff is
+made with and without the pathspecs, and the file units of both are run through the file filters.
+Commits whose surviving file units differ are listed; the filters match more than the path (a
+removed "-- " line that reads like a "--- a/" line), which pathspecs cannot.
+
+Bugfix commits are the commits whose message mentions a key of --project (all commits without
+it), the first --diffs of them with a single parent, diffed with the options of the SZZ scripts.
+Both ways are run once unmeasured first, so that the repository's objects are equally warm.
+
+usage: python benchmarks/bench_diff_pathspecs.py path/to/repo [--project HIVE] [--diffs 500]
+"""
+import argparse
+import os
+import sys
+import time
+
+from git import Repo
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.commit_table import CommitTable
+from common.git_stream import GitStream
+from common.unified_diff import parse_diff
+from common.unit_filters import FilterSet
+
+FILE_FILTERS = ["testfiles", "filetypes"]
+
+
+def file_units(repo, commits, file_filters, push_down):
+    # (diff bytes, [surviving file unit texts] of every commit)
+    stream = GitStream.of(repo)
+    n_bytes, units = 0, []
+    for sha, parent_sha in commits:
+        pathspecs = file_filters.diff_pathspecs(repo, sha, parent_sha) if push_down else ()
+        diff = stream.diff(sha, parent_sha, '--diff-filter=MRC', *pathspecs)
+        n_bytes += len(diff)
+        # the file that ends a diff has lost its final newline (see GitStream.diff), and which one
+        # does depends on the files left out
+        units.append([file_unit.text[:-1] if file_unit.text.endswith('\n') else file_unit.text
+                      for file_unit in file_filters.files(parse_diff(diff))])
+    return n_bytes, units
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("repo")
+    parser.add_argument("--project")
+    parser.add_argument("--diffs", type=int, default=500)
+    args = parser.parse_args()
+
+    repo = Repo(args.repo)
+    table = CommitTable.build(repo, args.project)
+    commits = [(sha, table.parents[table.rows[sha]][0]) for sha in table
+               if len(table.parents[table.rows[sha]]) == 1 and (args.project is None or table.jira_key(sha) is not None)]
+    commits = commits[:args.diffs]
+    file_filters = FilterSet(FILE_FILTERS)
+    print("%d commits, pathspecs %s" % (len(commits), ' '.join(file_filters.pathspecs())))
+
+    print("%-20s %10s %10s %10s" % ("", "time [s]", "diff MB", "files"))
+    results = {}
+    for name, push_down in (("python filters", False), ("pushed down", True)):
+        file_units(repo, commits, file_filters, push_down)
+        start = time.time()
+        n_bytes, results[name] = file_units(repo, commits, file_filters, push_down)
+        elapsed = time.time() - start
+        print("%-20s %10.3f %10.1f %10d" % (name, elapsed, n_bytes / 1024 ** 2,
+                                             sum(len(units) for units in results[name])))
+
+    mismatches = [sha for (sha, _), expected, pushed in zip(commits, results["python filters"], results["pushed down"])
+                  if expected != pushed]
+    print("%d commits with other file units%s" % (len(mismatches), ": " + " ".join(mismatches[:10]) if mismatches else ""))
@@ -0,0 +1,56 @@
+"""
+Diff and stats throughput of a git process per call (repo.git.diff, commit.stats) against the
+long-lived diff-tree process of common/git_stream.py, one request at a time and pipelined.
+The outputs are checked to be identical.
+
+usage: python benchmarks/bench_git_stream.py path/to/repo [--commits 2000]
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+from git import Repo
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.git_stream import GitStream
+
+ESZZ_DIFF_OPTIONS = ('--unified=1', '--diff-filter=MRC', '--ignore-cr-at-eol', '--ignore-space-at-eol',
+                     '--ignore-blank-lines', '--ignore-space-change')
+
+
+def timed(fn):
+    start = time.time()
+    result = fn()
+    return time.time() - start, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("repo")
+    parser.add_argument("--commits", type=int, default=2000)
+    args = parser.parse_args()
+
+    repo = Repo(args.repo)
+    commits = [commit for commit in itertools.islice(repo.iter_commits(), args.commits) if commit.parents]
+    pairs = [(commit.hexsha, commit.parents[0].hexsha) for commit in commits]
+    stream = GitStream.of(repo)
+
+    print("%d commits" % len(commits))
+    print("%-22s %10s %12s" % ("", "time [s]", "commits/s"))
+    rows = [
+        ("diff, process per call", lambda: [repo.git.diff(*(ESZZ_DIFF_OPTIONS + (sha + '^', sha))) for sha, _ in pairs]),
+        ("diff, stream", lambda: [stream.diff(sha, parent, *ESZZ_DIFF_OPTIONS) for sha, parent in pairs]),
+        ("diff, pipelined", lambda: list(stream.diffs(pairs, *ESZZ_DIFF_OPTIONS))),
+        ("stats, process per call", lambda: [commit.stats.files for commit in commits]),
+        ("stats, stream", lambda: [stream.stats(commit).files for commit in commits]),
+        ("stats, pipelined", lambda: [stats.files for stats in stream.stats_many(commits)]),
+    ]
+    results = {}
+    for name, fn in rows:
+        elapsed, results[name] = timed(fn)
+        print("%-22s %10.2f %12.0f" % (name, elapsed, len(commits) / elapsed))
+    assert results["diff, process per call"] == results["diff, stream"] == results["diff, pipelined"]
+    assert results["stats, process per call"] == results["stats, stream"] == results["stats, pipelined"]
+    stream.close()
@@ -0,0 +1,85 @@
+"""
+Worker scaling of JIRA issue lookups, with and without a multiprocessing.Manager lock.
+
+Every task looks up a batch of issue keys, the way get_blamed_shas does for the bugfix
+commit and its blamed commits. The "locked" mode wraps each lookup in a Manager().Lock()
+like the scripts used to, the "lock-free" mode reads the index inherited from the parent.
+
+usage: python benchmarks/bench_issue_lookup.py [--issues path/to/issue_cache.json] [--max-workers N]
+"""
+import argparse
+import gc
+import multiprocessing as mp
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.issue_store import IssueStore
+
+ISSUES = None
+
+
+def synthetic_issues(n):
+    from jira.resources import Issue
+    return [Issue(None, None, {"key": "HIVE-" + str(i), "fields": {}}) for i in range(1, n + 1)]
+
+
+def init_worker(issues):
+    global ISSUES
+    ISSUES = issues
+
+
+def lookup_batch(keys, lock=None):
+    found = 0
+    for key in keys:
+        if lock is not None:
+            lock.acquire()
+            issue = ISSUES.get(key)
+            lock.release()
+        else:
+            issue = ISSUES.get(key)
+        if issue is not None:
+            found += 1
+    return found
+
+
+def run(workers, batches, lock):
+    start = time.time()
+    with mp.Pool(workers, initializer=init_worker, initargs=(ISSUES,)) as p:
+        p.starmap(lookup_batch, zip(batches, [lock] * len(batches)))
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--issues", help="issue_cache.json to load, synthetic issues are used if missing")
+    parser.add_argument("--num-issues", type=int, default=20000)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--lookups-per-task", type=int, default=50)
+    parser.add_argument("--max-workers", type=int, default=mp.cpu_count())
+    args = parser.parse_args()
+
+    if args.issues:
+        ISSUES = IssueStore.load(args.issues)
+    else:
+        ISSUES = IssueStore(synthetic_issues(args.num_issues))
+    keys = [issue.key for issue in ISSUES]
+    random.seed(0)
+    batches = [random.sample(keys, min(args.lookups_per_task, len(keys))) for _ in range(args.tasks)]
+    gc.freeze()
+
+    m = mp.Manager()
+    lock = m.Lock()
+
+    print("%d issues, %d tasks x %d lookups" % (len(ISSUES), args.tasks, args.lookups_per_task))
+    print("%8s %12s %12s %8s" % ("workers", "locked [s]", "lock-free [s]", "speedup"))
+    workers = 1
+    while True:
+        locked = run(workers, batches, lock)
+        lock_free = run(workers, batches, None)
+        print("%8d %12.3f %12.3f %7.1fx" % (workers, locked, lock_free, locked / lock_free))
+        if workers >= args.max_workers:
+            break
+        workers = min(workers * 2, args.max_workers)
@@ -0,0 +1,44 @@
+"""
+Startup cost of the JIRA issue cache: issue_cache.json through jira_cache vs the compact store.
+
+usage: python benchmarks/bench_issue_store_load.py path/to/jira/hive/
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.issue_store import IssueStore
+from common.compact_issue_store import CompactIssueStore, convert_issue_cache
+
+
+def timed(f, *args):
+    start = time.time()
+    result = f(*args)
+    return result, time.time() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("jira_path", help="directory of the project's issue_cache.json, e.g. jira/hive/")
+    args = parser.parse_args()
+
+    jira_path = args.jira_path
+    json_path = os.path.join(jira_path, 'issue_cache.json')
+    store_dir = os.path.join(jira_path, 'issue_store')
+
+    _, convert_time = timed(convert_issue_cache, json_path, store_dir)
+    json_store, json_time = timed(IssueStore.load, json_path)
+    compact_store, compact_time = timed(CompactIssueStore.load, store_dir)
+
+    keys = [issue.key for issue in json_store]
+    _, json_lookup_time = timed(lambda: [json_store.get(key).fields.created for key in keys])
+    _, compact_lookup_time = timed(lambda: [compact_store.get(key).fields.created for key in keys])
+
+    print("%d issues" % len(json_store))
+    print("conversion:           %8.3f s" % convert_time)
+    print("load issue_cache.json: %8.3f s" % json_time)
+    print("load compact store:    %8.3f s" % compact_time)
+    print("lookup all (json):     %8.3f s" % json_lookup_time)
+    print("lookup all (compact):  %8.3f s" % compact_lookup_time)
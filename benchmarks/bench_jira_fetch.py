@@ -0,0 +1,55 @@
+"""
+Throughput and retry behavior of the concurrent JIRA download against the local stand-in
+server (benchmarks/mock_jira.py), which adds per-request latency and answers 429 with a
+Retry-After header above a request rate.
+
+usage: python benchmarks/bench_jira_fetch.py [--issues 5000] [--latency 0.05] [--rate-limit 40]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.jira_fetch import fetch_all_issues
+from mock_jira import MockJira
+
+
+def run(mock, workers, page_size):
+    jira_path = tempfile.mkdtemp()
+    journal_path = os.path.join(jira_path, "journal.jsonl")
+    requests, rejected = mock.requests, mock.rejected
+    try:
+        start = time.time()
+        fetch_all_issues(mock.url, mock.project, jira_path, journal_path, page_size=page_size, workers=workers)
+        elapsed = time.time() - start
+        with open(journal_path) as fp:
+            keys = {json.loads(line)["key"] for line in fp}
+        assert keys == set(mock.issues), "download is incomplete"
+    finally:
+        shutil.rmtree(jira_path)
+    return elapsed, mock.requests - requests, mock.rejected - rejected
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--issues", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the mock server takes per request")
+    parser.add_argument("--rate-limit", type=int, default=40, help="requests per second before the mock answers 429")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    mock = MockJira(num_issues=args.issues, max_results=args.page_size, latency=args.latency,
+                    max_requests_per_second=args.rate_limit, retry_after=1).start()
+    try:
+        print("%d issues, %.0f ms latency, 429 above %d requests/s" % (args.issues, args.latency * 1000, args.rate_limit))
+        print("%8s %10s %12s %10s %10s" % ("workers", "time [s]", "issues/s", "requests", "429s"))
+        for workers in args.workers:
+            elapsed, requests, rejected = run(mock, workers, args.page_size)
+            print("%8d %10.2f %12.0f %10d %10d" % (workers, elapsed, args.issues / elapsed, requests, rejected))
+    finally:
+        mock.stop()
@@ -0,0 +1,76 @@
+"""
+Incremental JIRA sync against the local stand-in server (benchmarks/mock_jira.py).
+
+1. a first sync is cut off by rate limiting half way through,
+2. the next sync resumes from the checkpoint instead of starting over,
+3. after some issues are edited on the server, a sync only fetches those.
+After every step the local issue_cache.json is compared with the server's issues.
+
+usage: python benchmarks/bench_jira_sync.py [--issues 2000] [--page-size 100]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from jira import JIRA, JIRAError
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.jira_sync import sync_issues, CACHE_FILE
+from mock_jira import MockJira
+
+
+def cached_issues(jira_path):
+    with open(os.path.join(jira_path, CACHE_FILE)) as fp:
+        return {raw_issue["key"]: raw_issue for raw_issue in json.load(fp)}
+
+
+def check(mock, jira_path):
+    assert cached_issues(jira_path) == mock.issues, "local cache differs from the server"
+
+
+def timed_sync(jira, mock, jira_path, page_size):
+    requests = mock.requests
+    start = time.time()
+    fetched = sync_issues(jira, mock.project, jira_path, page_size=page_size)
+    return fetched, mock.requests - requests, time.time() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--issues", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    jira_path = tempfile.mkdtemp()
+    pages = args.issues // args.page_size
+    mock = MockJira(num_issues=args.issues, max_results=args.page_size, fail_after=pages // 2).start()
+    try:
+        jira = JIRA(options={"server": mock.url}, max_retries=0)
+
+        try:
+            sync_issues(jira, mock.project, jira_path, page_size=args.page_size)
+            raise AssertionError("the mock server should have rate limited the first sync")
+        except JIRAError as e:
+            print("first sync interrupted with HTTP %d after %d requests" % (e.status_code, mock.requests))
+
+        mock.fail_after = None
+        fetched, requests, elapsed = timed_sync(jira, mock, jira_path, args.page_size)
+        check(mock, jira_path)
+        print("resumed sync:     %5d issues, %3d requests, %.2f s" % (fetched, requests, elapsed))
+
+        for number in range(1, args.issues + 1, max(1, args.issues // 25)):
+            mock.touch(number)
+        fetched, requests, elapsed = timed_sync(jira, mock, jira_path, args.page_size)
+        check(mock, jira_path)
+        print("incremental sync: %5d issues, %3d requests, %.2f s" % (fetched, requests, elapsed))
+
+        fetched, requests, elapsed = timed_sync(jira, mock, jira_path, args.page_size)
+        check(mock, jira_path)
+        print("no-op sync:       %5d issues, %3d requests, %.2f s" % (fetched, requests, elapsed))
+    finally:
+        mock.stop()
+        shutil.rmtree(jira_path)
@@ -0,0 +1,156 @@
+"""
+git invocations and time of the blame step on a sample of bugfix commits: one git log -L per
+changed line, as the SZZ scripts used to run it, against one range query per hunk
+(common/line_log.py). The per-line histories are checked to be identical.
+
+Also times the SZZ case of reading only the first commit of each line's history, from the
+buffered query against the streaming one that stops git after the first commit, and the blamed
+commit of each line from git blame against a lookup in the line origin index (built first, from
+scratch, in a temporary directory).
+
+Bugfix commits are the commits whose message mentions a key of --project (all commits without
+it); their changed lines are blamed from the parent side, with the options of the SZZ and the
+E-SZZ scripts.
+
+usage: python benchmarks/bench_line_log.py path/to/repo [--project HIVE] [--commits 100]
+"""
+import argparse
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from git import Repo
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.blame import PorcelainBlame, IndexedBlame
+from common.commit_table import CommitTable
+from common.line_log import LineLog
+
+ESZZ_OPTIONS = ('--no-merges', '--ignore-cr-at-eol', '--ignore-space-at-eol', '--ignore-blank-lines',
+                '--ignore-space-change')
+
+HUNK_PATTERN = re.compile(r'^@@ -(\d+),?(\d*) ', re.MULTILINE)
+
+
+def changed_hunks(repo, sha, parent):
+    # (parent path, start, count) of every hunk that changes lines of the parent
+    hunks = []
+    for file_diff in ('\n' + repo.git.diff('-U0', '--diff-filter=MRC', parent, sha)).split('\ndiff --git')[1:]:
+        path = re.search(r'^--- a/(.*)$', file_diff, re.MULTILINE)
+        if path is None:
+            continue
+        for start, count in HUNK_PATTERN.findall(file_diff):
+            count = int(count) if count else 1
+            if count > 0:
+                hunks.append((path.group(1), int(start), count))
+    return hunks
+
+
+def histories(history_of, hunk):
+    # a failing query ends the hunk, as it ended the blame of the commit
+    result = []
+    try:
+        for shas in history_of(hunk):
+            result.append(list(shas))
+    except Exception:
+        result.append(None)
+    return result
+
+
+def per_line(line_log, sha):
+    return lambda hunk: (line_log.line_history(line, hunk[0], sha) for line in range(hunk[1], hunk[1] + hunk[2]))
+
+
+def first_commit(shas, sha):
+    return next((blamed for blamed in shas if blamed != sha), None)
+
+
+def first_commits(history_of, line_log, work):
+    result = []
+    for sha, hunks in work:
+        for filename, start, count in hunks:
+            for line in range(start, start + count):
+                try:
+                    result.append(first_commit(history_of(line_log)(line, filename, sha), sha))
+                except Exception:
+                    result.append(None)
+    return result
+
+
+def blamed_commits(blame, work):
+    result = []
+    for sha, hunks in work:
+        for filename, start, count in hunks:
+            try:
+                for _, shas in blame.file_histories([(start, count)], filename, sha):
+                    result.append(next(shas, None))
+            except Exception:
+                result.append(None)
+    return result
+
+
+def per_range(line_log, sha):
+    return lambda hunk: line_log.histories(hunk[1], hunk[2], hunk[0], sha)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("repo")
+    parser.add_argument("--project")
+    parser.add_argument("--commits", type=int, default=100)
+    args = parser.parse_args()
+
+    repo = Repo(args.repo)
+    table = CommitTable.build(repo, args.project)
+    shas = [sha for sha in table if len(table.parents[table.rows[sha]]) == 1 and
+            (args.project is None or table.jira_key(sha) is not None)]
+    random.seed(0)
+    sample = random.sample(shas, min(args.commits, len(shas)))
+    work = [(sha, changed_hunks(repo, sha, table.parents[table.rows[sha]][0])) for sha in sample]
+    n_hunks = sum(len(hunks) for _, hunks in work)
+    n_lines = sum(count for _, hunks in work for _, _, count in hunks)
+
+    print("%d commits, %d hunks, %d lines" % (len(work), n_hunks, n_lines))
+    print("%-20s %12s %10s %10s" % ("", "git calls", "fallbacks", "time [s]"))
+    for variant, options in (("SZZ", ()), ("E-SZZ", ESZZ_OPTIONS)):
+        results = {}
+        for name, history_of in (("per line", per_line), ("per hunk", per_range)):
+            line_log = LineLog(repo, table, options)
+            start = time.time()
+            results[name] = [histories(history_of(line_log, sha), hunk) for sha, hunks in work for hunk in hunks]
+            elapsed = time.time() - start
+            print("%-20s %12d %10d %10.2f" % (variant + ", " + name, line_log.invocations, line_log.fallbacks,
+                                               elapsed))
+        assert results["per line"] == results["per hunk"]
+
+    print("%-20s %12s %10s %10s" % ("first commit", "git calls", "", "time [s]"))
+    results = {}
+    for name, history_of in (("buffered", lambda line_log: line_log.line_history),
+                             ("streaming", lambda line_log: line_log.stream_line_history)):
+        line_log = LineLog(repo, table)
+        start = time.time()
+        results[name] = first_commits(history_of, line_log, work)
+        elapsed = time.time() - start
+        print("%-20s %12d %10s %10.2f" % (name, line_log.invocations, "", elapsed))
+    assert results["buffered"] == results["streaming"]
+
+    index_dir = tempfile.mkdtemp()
+    try:
+        index_blame = IndexedBlame(repo, table, index_dir=index_dir)
+        start = time.time()
+        indexed = index_blame.index.update()
+        print("index: %d commits in %.2fs" % (indexed, time.time() - start))
+        print("%-20s %12s %10s %10s" % ("blamed commit", "git calls", "", "time [s]"))
+        results = {}
+        for name, blame in (("git blame", PorcelainBlame(repo, table)), ("index", index_blame)):
+            start = time.time()
+            results[name] = blamed_commits(blame, work)
+            elapsed = time.time() - start
+            print("%-20s %12d %10s %10.2f" % (name, blame.invocations + blame.line_log.invocations, "", elapsed))
+        assert results["git blame"] == results["index"]
+    finally:
+        shutil.rmtree(index_dir)
@@ -0,0 +1,82 @@
+"""
+Per-task overhead of the SZZ worker pool: tasks that carry (sha, Repo, refactorings DataFrame),
+as the scripts used to send them, against sha-only tasks whose inputs are set up once per worker
+by the pool initializer. The task itself only looks the sha up, so the timings are overhead.
+
+usage: python benchmarks/bench_pool_payload.py path/to/repo [--tasks 2000] [--refactorings 24000]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from git import Repo
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.refactorings import RefactoringIndex
+
+REPO = None
+REFACTORINGS = None
+
+
+def synthetic_refactorings(shas, n, path):
+    random.seed(0)
+    with open(path, "w") as fp:
+        fp.write("sha,file,type,begin,end\n")
+        for _ in range(n):
+            begin = random.randint(1, 2000)
+            fp.write("%s,src/File%d.java,RENAME,%d,%d\n" % (random.choice(shas), random.randint(0, 500), begin,
+                                                             begin + random.randint(0, 20)))
+
+
+def task_with_payload(sha, repo, refactorings):
+    return sha, repo.git_dir is not None, len(refactorings[refactorings.sha == sha])
+
+
+def init_worker(repo_path, refactorings):
+    global REPO, REFACTORINGS
+    REPO = Repo(repo_path)
+    REFACTORINGS = refactorings
+
+
+def task_sha_only(sha):
+    return sha, REPO.git_dir is not None, len(REFACTORINGS.ranges.get((sha, "src/File0.java"), []))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("repo")
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--refactorings", type=int, default=24000)
+    parser.add_argument("--workers", type=int, default=mp.cpu_count())
+    args = parser.parse_args()
+
+    repo = Repo(args.repo)
+    shas = repo.git.rev_list("HEAD").split()
+    csv_path = os.path.join(tempfile.mkdtemp(), "refactorings.csv")
+    synthetic_refactorings(shas, args.refactorings, csv_path)
+    frame = pd.read_csv(csv_path)
+    index = RefactoringIndex.load(csv_path)
+    tasks = [shas[i % len(shas)] for i in range(args.tasks)]
+
+    print("%d tasks, %d workers, %d refactorings" % (args.tasks, args.workers, args.refactorings))
+    print("%-28s %14s %10s %14s" % ("", "payload [B]", "time [s]", "per task [ms]"))
+
+    payload = len(pickle.dumps((tasks[0], repo, frame)))
+    start = time.time()
+    with mp.Pool(args.workers) as p:
+        p.starmap(task_with_payload, zip(tasks, [repo] * len(tasks), [frame] * len(tasks)))
+    elapsed = time.time() - start
+    print("%-28s %14d %10.2f %14.3f" % ("sha, Repo, DataFrame", payload, elapsed, elapsed * 1000 / len(tasks)))
+
+    payload = len(pickle.dumps(tasks[0]))
+    start = time.time()
+    with mp.Pool(args.workers, initializer=init_worker, initargs=(args.repo, index)) as p:
+        p.map(task_sha_only, tasks)
+    elapsed = time.time() - start
+    print("%-28s %14d %10.2f %14.3f" % ("sha, initializer inputs", payload, elapsed, elapsed * 1000 / len(tasks)))
@@ -0,0 +1,124 @@
+"""
+Blame throughput of the SZZ worker pool with one task per bugfix commit, in history order as the
+scripts queue them, against one task per changed file in file affinity order (see
+common/task_schedule.py). Every task blames the parent side lines its hunks change, with LineLog
+as the SZZ scripts do; the blamed commits of both schedules are checked to be identical.
+
+Bugfix commits are the commits whose message mentions a key of --project (all commits without
+it). With --drop-caches (root only) the OS page cache is dropped before each schedule, otherwise
+a first unmeasured pass warms it for both.
+
+usage: python benchmarks/bench_task_schedule.py path/to/repo [--project HIVE] [--commits 500]
+       [--workers 8] [--drop-caches]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from git import Repo
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.commit_table import CommitTable
+from common.diff_cache import DiffCache
+from common.line_log import LineLog
+from common.task_schedule import changed_paths, file_affinity_tasks
+
+HUNK_PATTERN = re.compile(r'^@@ -(\d+),?(\d*) ', re.MULTILINE)
+
+REPO = None
+COMMITS = None
+LINE_LOG = None
+DIFF_CACHE = None
+
+
+def init_worker(repo_path, commits, diff_cache_dir):
+    global REPO, COMMITS, LINE_LOG, DIFF_CACHE
+    REPO = Repo(repo_path)
+    COMMITS = commits
+    commits.repo = REPO
+    LINE_LOG = LineLog(REPO, commits)
+    # as in the scripts, the tasks of a commit's other files read its diff from the cache
+    DIFF_CACHE = DiffCache(diff_cache_dir)
+
+
+def blame_task(sha, paths=None):
+    # (sha, blamed shas, lines) of the parent side hunks of sha's files in paths (all without)
+    diff = DIFF_CACHE.diff(REPO, sha, COMMITS.parents[COMMITS.rows[sha]][0], '-U0', '--diff-filter=MRC')
+    blamed = set()
+    n_lines = 0
+    for file_diff in ('\n' + diff).split('\ndiff --git')[1:]:
+        old_path = re.search(r'^--- a/(.*)$', file_diff, re.MULTILINE)
+        new_path = re.search(r'^\+\+\+ b/(.*)$', file_diff, re.MULTILINE)
+        if old_path is None or new_path is None or (paths is not None and new_path.group(1) not in paths):
+            continue
+        ranges = [(int(start), int(count) if count else 1) for start, count in HUNK_PATTERN.findall(file_diff)]
+        ranges = [(start, count) for start, count in ranges if count > 0]
+        try:
+            for _, shas in LINE_LOG.file_histories(ranges, old_path.group(1), sha + '^'):
+                n_lines += 1
+                blamed.update(shas[:1])
+        except Exception:
+            pass
+    return sha, blamed, n_lines
+
+
+def run(repo_path, table, tasks, workers):
+    diff_cache_dir = tempfile.mkdtemp()
+    try:
+        start = time.time()
+        with mp.Pool(workers, initializer=init_worker, initargs=(repo_path, table, diff_cache_dir)) as p:
+            results = p.starmap(blame_task, tasks)
+        elapsed = time.time() - start
+    finally:
+        shutil.rmtree(diff_cache_dir)
+    blamed = {}
+    for sha, shas, _ in results:
+        blamed.setdefault(sha, set()).update(shas)
+    return elapsed, sum(n_lines for _, _, n_lines in results), blamed
+
+
+def drop_caches():
+    subprocess.check_call(['sync'])
+    with open('/proc/sys/vm/drop_caches', 'w') as fp:
+        fp.write('3\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("repo")
+    parser.add_argument("--project")
+    parser.add_argument("--commits", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=mp.cpu_count())
+    parser.add_argument("--drop-caches", action="store_true")
+    args = parser.parse_args()
+
+    repo = Repo(args.repo)
+    table = CommitTable.build(repo, args.project)
+    shas = [sha for sha in table if len(table.parents[table.rows[sha]]) == 1 and
+            (args.project is None or table.jira_key(sha) is not None)]
+    random.seed(0)
+    sample = set(random.sample(shas, min(args.commits, len(shas))))
+    # in the order the scripts queue them
+    shas = [sha for sha in shas if sha in sample]
+
+    schedules = (("per commit", [(sha, None) for sha in shas]),
+                 ("per file, affinity", file_affinity_tasks(table, shas, changed_paths(repo))))
+    if not args.drop_caches:
+        run(args.repo, table, schedules[0][1], args.workers)
+
+    print("%d commits, %d workers" % (len(shas), args.workers))
+    print("%-20s %8s %8s %10s %10s" % ("", "tasks", "lines", "time [s]", "lines/s"))
+    results = {}
+    for name, tasks in schedules:
+        if args.drop_caches:
+            drop_caches()
+        elapsed, n_lines, results[name] = run(args.repo, table, tasks, args.workers)
+        print("%-20s %8d %8d %10.2f %10.1f" % (name, len(tasks), n_lines, elapsed, n_lines / elapsed))
+    assert results["per commit"] == results["per file, affinity"]
@@ -0,0 +1,153 @@
+"""
+Local stand-in for the JIRA REST API, enough of it for the jira client's search_issues.
+
+Understands the JQL the sync and fetch code sends (project=X [AND updated >= "yyyy/MM/dd HH:mm"]
+[AND key >= X-a AND key < X-b] ORDER BY updated|key [ASC|DESC]), caps maxResults like a real
+server and can inject failures: HTTP 429 after a number of requests or above a request rate.
+"""
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PROJECT_PATTERN = re.compile(r'project\s*=\s*(\w+)', re.IGNORECASE)
+UPDATED_PATTERN = re.compile(r'updated\s*>=\s*"([^"]+)"', re.IGNORECASE)
+KEY_PATTERN = re.compile(r'key\s*(>=|<)\s*\w+-(\d+)', re.IGNORECASE)
+ORDER_PATTERN = re.compile(r'ORDER BY (\w+)(?: (ASC|DESC))?', re.IGNORECASE)
+JIRA_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f%z'
+
+
+def make_issue(base_url, project, number, updated):
+    key = project + "-" + str(number)
+    return {"self": base_url + "/rest/api/2/issue/" + str(number), "id": str(number), "key": key,
+            "fields": {"issuetype": {"self": base_url + "/rest/api/2/issuetype/1", "name": "Bug"},
+                       "summary": "summary of " + key, "description": "description of " + key,
+                       "created": updated, "updated": updated, "resolutiondate": None,
+                       "versions": [], "fixVersions": [], "components": [],
+                       "comment": {"total": 0, "comments": []}, "attachment": [], "issuelinks": []}}
+
+
+def format_date(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.') + '%03d' % (moment.microsecond // 1000) + '+0000'
+
+
+class MockJira(object):
+
+    def __init__(self, project="HIVE", num_issues=1000, max_results=100, latency=0.0, fail_after=None,
+                 max_requests_per_second=None, retry_after=1):
+        self.project = project
+        self.max_results = max_results
+        self.latency = latency
+        self.fail_after = fail_after
+        self.max_requests_per_second = max_requests_per_second
+        self.retry_after = retry_after
+        self.requests = 0
+        self.rejected = 0
+        self._recent = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self.url = "http://127.0.0.1:%d" % self._server.server_address[1]
+        self.clock = datetime(2019, 1, 1, tzinfo=timezone.utc)
+        self.issues = {}
+        for number in range(1, num_issues + 1):
+            # several issues per minute, so pages split minutes
+            self.touch(number, advance=timedelta(seconds=7))
+
+    def touch(self, number, advance=timedelta(seconds=1)):
+        # create or update issue <project>-<number>
+        with self._lock:
+            self.clock += advance
+            issue = make_issue(self.url, self.project, number, format_date(self.clock))
+            old = self.issues.get(issue["key"])
+            if old is not None:
+                issue["fields"]["created"] = old["fields"]["created"]
+            self.issues[issue["key"]] = issue
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _throttled(self):
+        with self._lock:
+            self.requests += 1
+            if self.fail_after is not None and self.requests > self.fail_after:
+                self.rejected += 1
+                return True
+            if self.max_requests_per_second is not None:
+                now = time.time()
+                self._recent = [t for t in self._recent if now - t < 1.0]
+                if len(self._recent) >= self.max_requests_per_second:
+                    self.rejected += 1
+                    return True
+                self._recent.append(now)
+            return False
+
+    def search(self, jql, start_at, max_results):
+        project = PROJECT_PATTERN.search(jql).group(1).upper()
+        with self._lock:
+            issues = [i for i in self.issues.values() if i["key"].startswith(project + "-")]
+        since = UPDATED_PATTERN.search(jql)
+        if since is not None:
+            cutoff = datetime.strptime(since.group(1), '%Y/%m/%d %H:%M').replace(tzinfo=timezone.utc)
+            issues = [i for i in issues if datetime.strptime(i["fields"]["updated"], JIRA_DATE_FORMAT) >= cutoff]
+        for operator, number in KEY_PATTERN.findall(jql):
+            if operator == ">=":
+                issues = [i for i in issues if int(i["id"]) >= int(number)]
+            else:
+                issues = [i for i in issues if int(i["id"]) < int(number)]
+        field, direction = ORDER_PATTERN.search(jql).groups()
+        if field.lower() == "updated":
+            issues.sort(key=lambda i: (i["fields"]["updated"], int(i["id"])))
+        else:
+            issues.sort(key=lambda i: int(i["id"]))
+        if direction is not None and direction.upper() == "DESC":
+            issues.reverse()
+        max_results = min(max_results, self.max_results)
+        return {"startAt": start_at, "maxResults": max_results, "total": len(issues),
+                "issues": issues[start_at:start_at + max_results]}
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, headers=()):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if url.path.endswith("/serverInfo"):
+                    return self._send(200, {"baseUrl": mock.url, "version": "8.20.0", "versionNumbers": [8, 20, 0],
+                                            "deploymentType": "Server"})
+                if url.path.endswith("/field"):
+                    return self._send(200, [])
+                if url.path.endswith("/search"):
+                    if mock._throttled():
+                        return self._send(429, {"errorMessages": ["Rate limit exceeded"]},
+                                          [("Retry-After", str(mock.retry_after))])
+                    if mock.latency:
+                        time.sleep(mock.latency)
+                    return self._send(200, mock.search(params["jql"], int(params.get("startAt", 0)),
+                                                       int(params.get("maxResults", 50))))
+                self._send(404, {"errorMessages": ["not mocked: " + url.path]})
+
+        return Handler
@@ -0,0 +1 @@
+# Helpers shared by the SZZ, E-SZZ and data preprocessing scripts.
@@ -0,0 +1,181 @@
+import subprocess
+
+from common.blame_scheduler import run_commands
+from common.git_stream import GitStream
+from common.line_log import LineLog
+from common.line_origin_index import LineOriginIndex
+
+# git log options that limit the history walk; git blame has no use for them
+LOG_ONLY_OPTIONS = ('--no-merges',)
+
+
+def parse_porcelain(lines):
+    """
+    {final line number: sha} of `git blame --porcelain` output, read line by line. Every blamed
+    line has a "<sha> <original line> <final line> [<group size>]" header, followed by the commit
+    details the first time the commit shows up and by the tab-prefixed line itself.
+    """
+    blamed = {}
+    for line in lines:
+        if line.startswith(b'\t'):
+            continue
+        fields = line.split()
+        if len(fields) >= 3 and len(fields[0]) == 40 and fields[1].isdigit() and fields[2].isdigit():
+            blamed[int(fields[2])] = fields[0].decode('ascii')
+    return blamed
+
+
+class PorcelainBlame(object):
+    """
+    Blame backend answering all lines of a file with a single `git blame --porcelain` call, one
+    -L option per range. Blame gives the commit that last changed each line, which is the first
+    commit git log -L lists for it unless that is the revision itself, or a merge (e.g. one that
+    resolved a conflict) while the options include --no-merges, which git blame has no equivalent
+    of. Those lines, and callers that need older commits as well (e.g. to skip refactorings), get
+    their history from the per-line git log -L query of LineLog.
+    """
+
+    def __init__(self, repo, commits, options=()):
+        self.repo = repo
+        self.repo_dir = repo.working_tree_dir or repo.git_dir
+        self.options = list(options)
+        self.line_log = LineLog(repo, commits, options)
+        self.hides_merges = '--no-merges' in self.options
+        self.invocations = 0
+        self.fallbacks = 0
+        self._prefetched = {}
+
+    def blame_args(self, ranges, filename, rev):
+        args = ['git', 'blame', '--porcelain'] + [option for option in self.options if option not in LOG_ONLY_OPTIONS]
+        for start, count in ranges:
+            args.append('-L %d,%d' % (start, start + count - 1))
+        return args + [rev, '--', filename]
+
+    def blame(self, ranges, filename, rev):
+        # {line: sha} of every line in ranges, None if git blame fails (e.g. a range runs past the
+        # end of the file)
+        args = self.blame_args(ranges, filename, rev)
+        prefetched = self._prefetched.pop(tuple(args), None)
+        if prefetched is not None:
+            self.invocations += 1
+            status, stdout, _ = prefetched
+            return parse_porcelain(stdout.split(b'\n')) if status == 0 else None
+        self.invocations += 1
+        process = subprocess.Popen(args, cwd=self.repo_dir, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        with process.stdout:
+            blamed = parse_porcelain(process.stdout)
+        return blamed if process.wait() == 0 else None
+
+    def prefetch(self, requests, concurrency, reads=None):
+        # runs the git blame calls of requests [(ranges, filename, rev)] up front, see LineLog.prefetch;
+        # the one call per request answers every line, however few of them the caller reads
+        commands = []
+        for ranges, filename, rev in requests:
+            ranges = [(start, count) for start, count in ranges if count > 0]
+            if ranges:
+                commands.append(self.blame_args(ranges, filename, str(rev)))
+        self._prefetched = run_commands(commands, self.repo_dir, concurrency)
+
+    def line_history(self, line, filename, rev):
+        return self.line_log.line_history(line, filename, rev)
+
+    def histories(self, start, count, filename, rev):
+        for _, shas in self.file_histories([(start, count)], filename, rev):
+            yield shas
+
+    def file_histories(self, ranges, filename, rev):
+        """
+        Yields (line, shas) for every line of ranges [(start, count)], shas in the order the
+        per-line git log -L query returns them. Older commits are only looked up when the caller
+        iterates past the blamed one.
+        """
+        rev = str(rev)
+        ranges = [(start, count) for start, count in ranges if count > 0]
+        blamed = self.blame(ranges, filename, rev) if ranges else {}
+        if blamed is None:
+            # LineLog raises at the first line whose own query fails, as before
+            self.fallbacks += 1
+            for line, shas in self.line_log.file_histories(ranges, filename, rev):
+                yield line, shas
+            return
+        commit_sha = GitStream.of(self.repo).object_id(rev + '^{commit}')
+        for line_start, count in ranges:
+            line = line_start
+            while line < line_start + count:
+                sha = blamed.get(line)
+                if self._listed_first(sha, commit_sha):
+                    yield line, self._history(sha, line, filename, rev)
+                    line += 1
+                    continue
+                # changed by rev itself: git log -L lists rev first, then the commits before it; or by
+                # a merge git log does not list. The lines in a row go to LineLog together
+                run_end = line + 1
+                while run_end < line_start + count and not self._listed_first(blamed.get(run_end), commit_sha):
+                    run_end += 1
+                self.fallbacks += 1
+                for run_line, shas in zip(range(line, run_end), self.line_log.histories(line, run_end - line,
+                                                                                        filename, rev)):
+                    yield run_line, shas
+                line = run_end
+
+    def _listed_first(self, sha, commit_sha):
+        # whether the blamed sha is the first commit git log -L lists for the line
+        if sha is None or sha == commit_sha:
+            return False
+        return not (self.hides_merges and self._is_merge(sha))
+
+    def _is_merge(self, sha):
+        commits = self.line_log.commits
+        if commits is not None and sha in commits:
+            return len(commits.parents[commits.rows[sha]]) > 1
+        return len(GitStream.of(self.repo).parents(sha)) > 1
+
+    def _history(self, sha, line, filename, rev):
+        yield sha
+        # the commits before sha, read only as far as the caller gets
+        found = False
+        skipped = []
+        for older in self.line_log.stream_line_history(line, filename, rev):
+            if found:
+                yield older
+            elif older == sha:
+                found = True
+            else:
+                skipped.append(older)
+        if not found:
+            for older in skipped:
+                yield older
+
+
+class IndexedBlame(PorcelainBlame):
+    """
+    PorcelainBlame answering from a LineOriginIndex instead of running git blame, so blaming a
+    line is a lookup. The index has to be brought up to date (index.update()) before the run;
+    file versions it cannot answer for are blamed by git blame as before. Like git blame, the
+    index gives the lines a merge changed to the merge; with --no-merges, those lines get their
+    history from LineLog (see PorcelainBlame).
+    """
+
+    def __init__(self, repo, commits, options=(), index_dir=None):
+        super(IndexedBlame, self).__init__(repo, commits, options)
+        self.index = LineOriginIndex(repo, self.options, index_dir)
+
+    def blame(self, ranges, filename, rev):
+        origins = self.index.origins(filename, rev)
+        if origins is None:
+            return super(IndexedBlame, self).blame(ranges, filename, rev)
+        # git blame fails on a range that starts past the end of the file, and cuts the others short
+        if any(start > len(origins) for start, _ in ranges):
+            return None
+        return {line: origins[line - 1] for start, count in ranges
+                for line in range(start, min(start + count, len(origins) + 1))}
+
+    def prefetch(self, requests, concurrency, reads=None):
+        # git is only asked about the files the index has no origins for
+        unindexed = [self.index.origins(filename, str(rev)) is None for _, filename, rev in requests]
+        super(IndexedBlame, self).prefetch([request for request, keep in zip(requests, unindexed) if keep], concurrency,
+                                           [lines_read for lines_read, keep in zip(reads, unindexed) if keep]
+                                           if reads is not None else None)
+
+
+BACKENDS = {'log': LineLog, 'blame': PorcelainBlame, 'index': IndexedBlame}
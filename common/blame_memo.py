@@ -0,0 +1,197 @@
+import hashlib
+import json
+import multiprocessing as mp
+from collections import OrderedDict
+
+from common.disk_cache import DiskCache
+from common.git_stream import GitStream
+
+# bump when the stored format or the blame semantics change, old entries then simply stop matching
+MEMO_VERSION = 1
+
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+# (revision, path) entries kept in memory per process
+DEFAULT_CAPACITY = 4096
+
+MEMORY_HITS, DISK_HITS, MISSES = range(3)
+
+
+def shared_counters():
+    # hit/miss counters the pool workers add to, created before the pool so workers inherit them
+    return mp.Array('q', 3)
+
+
+def format_counters(counters):
+    memory_hits, disk_hits, misses = counters[MEMORY_HITS], counters[DISK_HITS], counters[MISSES]
+    total = memory_hits + disk_hits + misses
+    return "blame memo: %d lines, %d memory hits, %d disk hits, %d misses (%.1f%% hit rate)" % (
+        total, memory_hits, disk_hits, misses, 100.0 * (memory_hits + disk_hits) / total if total else 0.0)
+
+
+class BlameMemo(object):
+    """
+    Memoizes the line histories of a blame backend (see common/blame.py), keyed by (revision,
+    path, line) and the backend's options. Entries live in an in-memory LRU of (revision, path)
+    entries and in a DiskCache that all workers and runs share.
+
+    Only what callers actually read is recorded: a history the caller stopped reading after the
+    first commit is stored as that prefix, and completed from the backend when a later caller
+    reads further.
+    """
+
+    def __init__(self, backend, directory, max_bytes=DEFAULT_MAX_BYTES, capacity=DEFAULT_CAPACITY, counters=None):
+        self.backend = backend
+        self.disk = DiskCache(directory, max_bytes)
+        self.capacity = capacity
+        self.memory = OrderedDict()
+        self.counters = counters if counters is not None else [0, 0, 0]
+
+    def key(self, commit_sha, filename):
+        key = '%d %s %s %s %s' % (MEMO_VERSION, type(self.backend).__name__, ' '.join(self.backend.options),
+                                  commit_sha, filename)
+        return hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def entry(self, key):
+        # ({line: [shas, complete]}, tier it came from)
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+            return entry, MEMORY_HITS
+        entry = self.load(key)
+        self.remember(key, entry)
+        return entry, DISK_HITS
+
+    def load(self, key):
+        text = self.disk.load(key)
+        return {int(line): value for line, value in json.loads(text).items()} if text is not None else {}
+
+    def store(self, key, entry):
+        # other workers may have stored lines of the same (revision, path) since this one loaded
+        # it, so the entry on disk is merged in rather than overwritten
+        for line, (shas, complete) in self.load(key).items():
+            recorded = entry.get(line)
+            if recorded is None or (complete and not recorded[1]) or (
+                    complete == recorded[1] and len(shas) > len(recorded[0])):
+                entry[line] = [shas, complete]
+        self.disk.store(key, json.dumps(entry))
+
+    def remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def count(self, counts):
+        lock = self.counters.get_lock() if hasattr(self.counters, 'get_lock') else None
+        if lock is not None:
+            lock.acquire()
+        try:
+            for tier, n in enumerate(counts):
+                self.counters[tier] += n
+        finally:
+            if lock is not None:
+                lock.release()
+
+    def prefetch(self, requests, concurrency, lines_read=None):
+        # lets the backend run the queries of requests [(ranges, filename, rev)] up front, for the
+        # lines the memo does not have yet; a caller that reads only the first lines_read lines of
+        # each request has only the queries of those lines run
+        missing_requests, reads = [], []
+        for ranges, filename, rev in requests:
+            rev = str(rev)
+            commit_sha = GitStream.of(self.repo).object_id(rev + '^{commit}')
+            if commit_sha is None:
+                continue
+            entry, _ = self.entry(self.key(commit_sha, filename))
+            lines = [line for start, count in ranges for line in range(start, start + count)]
+            missing = [line for line in lines if line not in entry]
+            # file_histories asks the backend for all missing lines at once, and reads as many of
+            # them as the caller reaches
+            missing_read = len([line for line in lines[:lines_read] if line not in entry])
+            if missing_read:
+                missing_requests.append((runs(missing), filename, rev))
+                reads.append(missing_read)
+        self.backend.prefetch(missing_requests, concurrency, reads)
+
+    def histories(self, start, count, filename, rev):
+        for _, shas in self.file_histories([(start, count)], filename, rev):
+            yield shas
+
+    def file_histories(self, ranges, filename, rev):
+        """
+        Yields (line, shas) for every line of ranges [(start, count)], as the backend would.
+        """
+        rev = str(rev)
+        commit_sha = GitStream.of(self.repo).object_id(rev + '^{commit}')
+        if commit_sha is None:
+            # the backend reports the bad revision as it did before
+            for line, shas in self.backend.file_histories(ranges, filename, rev):
+                yield line, shas
+            return
+        key = self.key(commit_sha, filename)
+        entry, tier = self.entry(key)
+        lines = [line for start, count in ranges for line in range(start, start + count)]
+        # decided up front, so the backend yields exactly the missing lines, in order
+        missing = [line not in entry for line in lines]
+        computed = None
+        counts = [0, 0, 0]
+        changed = [False]
+        try:
+            for line, is_missing in zip(lines, missing):
+                if not is_missing:
+                    counts[tier] += 1
+                    yield line, self._recorded(entry, line, filename, rev, changed)
+                    continue
+                counts[MISSES] += 1
+                if computed is None:
+                    computed = self.backend.file_histories(
+                        runs([other for other, other_missing in zip(lines, missing) if other_missing]), filename, rev)
+                _, shas = next(computed)
+                yield line, self._record(entry, line, shas, changed)
+        finally:
+            self.count(counts)
+            if changed[0]:
+                self.store(key, entry)
+
+    @property
+    def repo(self):
+        return self.backend.repo
+
+    def _record(self, entry, line, shas, changed):
+        changed[0] = True
+        if isinstance(shas, list):
+            entry[line] = [shas, True]
+            for sha in shas:
+                yield sha
+            return
+        recorded = entry[line] = [[], False]
+        for sha in shas:
+            recorded[0].append(sha)
+            yield sha
+        recorded[1] = True
+
+    def _recorded(self, entry, line, filename, rev, changed):
+        shas, complete = entry[line]
+        for sha in list(shas):
+            yield sha
+        if complete:
+            return
+        # the history was only read up to here so far
+        history = self.backend.line_history(line, filename, rev)
+        older = history[len(shas):] if history[:len(shas)] == shas else [sha for sha in history if sha not in shas]
+        entry[line] = [shas + older, True]
+        changed[0] = True
+        for sha in older:
+            yield sha
+
+
+def runs(lines):
+    # [(start, count)] of the runs of consecutive line numbers, in the order given
+    ranges = []
+    for line in lines:
+        if ranges and ranges[-1][0] + ranges[-1][1] == line:
+            ranges[-1] = (ranges[-1][0], ranges[-1][1] + 1)
+        else:
+            ranges.append((line, 1))
+    return ranges
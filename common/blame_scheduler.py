@@ -0,0 +1,27 @@
+import asyncio
+
+
+async def _run(args, cwd, semaphore):
+    async with semaphore:
+        process = await asyncio.create_subprocess_exec(*args, cwd=cwd, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await process.communicate()
+        return process.returncode, stdout, stderr
+
+
+async def _run_all(commands, cwd, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*[_run(args, cwd, semaphore) for args in commands])
+
+
+def run_commands(commands, cwd, concurrency):
+    """
+    Runs every command (a list of program arguments) in cwd, at most concurrency of them at a
+    time, and returns {tuple(command): (exit status, stdout bytes, stderr bytes)}. Blame queries
+    are independent and mostly wait on git, so a commit's queries can all be in flight at once.
+    """
+    commands = list(dict.fromkeys(tuple(args) for args in commands))
+    if not commands:
+        return {}
+    results = asyncio.run(_run_all(commands, cwd, max(1, concurrency)))
+    return dict(zip(commands, results))
@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from common.jira_keys import JiraKeyIndex, RECORD_SEPARATOR
+
+# git log fields are split on the ascii unit separator, which never shows up in shas or dates
+FIELD_SEPARATOR = '\x1f'
+
+# sha, parents, commit/author epoch, committer utc offset and the raw message; the message goes
+# last since it is the only field that can contain newlines
+LOG_FORMAT = RECORD_SEPARATOR + FIELD_SEPARATOR.join(['%H', '%P', '%ct', '%at', '%cd', '%B'])
+
+
+def parse_utc_offset(offset):
+    # "+0130" -> 90
+    minutes = int(offset[1:3]) * 60 + int(offset[3:5])
+    return -minutes if offset[0] == '-' else minutes
+
+
+class TableCommit(object):
+    """
+    Read-only stand-in for a GitPython commit, backed by a row of a CommitTable. Provides the
+    attributes the pipeline reads: hexsha, parents, committed_date, committed_datetime,
+    authored_date, message and repo.
+    """
+
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    @property
+    def hexsha(self):
+        return self.table.shas[self.row]
+
+    @property
+    def parents(self):
+        return [self.table.commit(parent) for parent in self.table.parents[self.row]]
+
+    @property
+    def committed_date(self):
+        return int(self.table.committed_date[self.row])
+
+    @property
+    def committed_datetime(self):
+        offset = timezone(timedelta(minutes=int(self.table.committer_tz[self.row])))
+        return datetime.fromtimestamp(self.committed_date, offset)
+
+    @property
+    def authored_date(self):
+        return int(self.table.authored_date[self.row])
+
+    @property
+    def message(self):
+        return self.table.messages[self.row]
+
+    @property
+    def repo(self):
+        return self.table.repo
+
+    def __eq__(self, other):
+        return getattr(other, 'hexsha', None) == self.hexsha
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.hexsha)
+
+    def __repr__(self):
+        return '<TableCommit "%s">' % self.hexsha
+
+
+class CommitTable(object):
+    """
+    Per-commit columns of the whole history (sha, parents, commit and author dates, message and
+    JIRA key), read with a single git log call and looked up by sha. Dates are seconds since the
+    epoch (utc). commit(sha) returns a TableCommit, so no GitPython objects are created.
+    """
+
+    def __init__(self, repo, shas, parents, committed_date, committer_tz, authored_date, messages, jira_keys=None):
+        self.repo = repo
+        self.shas = shas
+        self.rows = {sha: row for row, sha in enumerate(shas)}
+        self.parents = parents
+        self.committed_date = committed_date
+        self.committer_tz = committer_tz
+        self.authored_date = authored_date
+        self.messages = messages
+        self.jira_keys = jira_keys
+
+    @classmethod
+    def build(cls, repo, project=None, jira_key_path=None, rev='HEAD'):
+        """
+        Read the history reachable from rev. With a JIRA project, the JIRA keys are extracted from
+        the same pass (see JiraKeyIndex, which is persisted at jira_key_path).
+        """
+        log = repo.git.log('--format=' + LOG_FORMAT, '--date=format:%z', rev)
+        shas, parents, committed, committer_tz, authored, messages = [], [], [], [], [], []
+        for record in log.split(RECORD_SEPARATOR)[1:]:
+            sha, parent_shas, committed_date, authored_date, offset, message = record.split(FIELD_SEPARATOR, 5)
+            shas.append(sha)
+            parents.append(tuple(parent_shas.split()))
+            committed.append(int(committed_date))
+            authored.append(int(authored_date))
+            committer_tz.append(parse_utc_offset(offset))
+            # git ends every record with a newline on top of the message's own
+            messages.append(message[:-1] if message.endswith('\n\n') else message)
+        jira_keys = None
+        if project is not None:
+            jira_keys = JiraKeyIndex.build(repo, project, jira_key_path, messages=zip(shas, messages))
+        return cls(repo, shas, parents, np.array(committed, dtype=np.int64), np.array(committer_tz, dtype=np.int16),
+                   np.array(authored, dtype=np.int64), messages, jira_keys)
+
+    def row(self, sha):
+        return self.rows.get(sha)
+
+    def commit(self, sha):
+        # commits outside the table (e.g. not reachable from rev) fall back to GitPython
+        row = self.rows.get(sha)
+        if row is None:
+            return self.repo.commit(sha)
+        return TableCommit(self, row)
+
+    def commits(self, shas):
+        return [self.commit(sha) for sha in shas]
+
+    def jira_key(self, sha):
+        return self.jira_keys.get(sha) if self.jira_keys is not None else None
+
+    def committed_dates(self, shas):
+        # commits outside the table fall back to GitPython, as in commit()
+        rows = [self.rows.get(sha) for sha in shas]
+        if None not in rows:
+            return self.committed_date[rows]
+        return np.array([self.committed_date[row] if row is not None else self.commit(sha).committed_date
+                         for sha, row in zip(shas, rows)], dtype=np.int64)
+
+    def committed_before(self, sha, cutoff):
+        # committed_date < cutoff (seconds since the epoch), without creating a commit object
+        row = self.rows.get(sha)
+        if row is None:
+            return self.commit(sha).committed_date < cutoff
+        return self.committed_date[row] < cutoff
+
+    def __contains__(self, sha):
+        return sha in self.rows
+
+    def __iter__(self):
+        return iter(self.shas)
+
+    def __len__(self):
+        return len(self.shas)
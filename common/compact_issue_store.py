@@ -0,0 +1,394 @@
+import json
+import mmap
+import os
+import shutil
+import sys
+from datetime import timedelta
+
+import numpy as np
+
+from common.issue_store import IssueStore, normalize_key, parse_jira_date, NAT, EPOCH
+
+# on-disk layout version, bump it whenever the columns below change
+STORE_VERSION = 1
+
+NO_STRING = -1
+
+# bits reserved for the issue number in the key code: project index << KEY_NUMBER_BITS | number
+KEY_NUMBER_BITS = 40
+
+# key code of the issues whose key has no number, which no lookup can ask for
+NO_KEY_CODE = -1
+
+
+def format_jira_date(epoch_ms, offset_minutes):
+    if epoch_ms == NAT:
+        return None
+    offset_minutes = int(offset_minutes)
+    local = EPOCH + timedelta(milliseconds=int(epoch_ms) + offset_minutes * 60000)
+    return '%04d-%02d-%02dT%02d:%02d:%02d.%03d%s%02d%02d' % (
+        local.year, local.month, local.day, local.hour, local.minute, local.second, local.microsecond // 1000,
+        '-' if offset_minutes < 0 else '+', abs(offset_minutes) // 60, abs(offset_minutes) % 60)
+
+
+def split_key(key):
+    project, _, number = normalize_key(key).partition('-')
+    if not number.isdigit():
+        return None, None
+    return project, int(number)
+
+
+class _StringTableBuilder(object):
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def add(self, string):
+        if string is None:
+            return NO_STRING
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.ids[string] = string_id
+            self.strings.append(string)
+        return string_id
+
+    def save(self, store_dir):
+        encoded = [s.encode('utf-8') for s in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        np.save(os.path.join(store_dir, 'string_offsets.npy'), offsets)
+        with open(os.path.join(store_dir, 'strings.bin'), 'wb') as fp:
+            # mmap refuses empty files
+            fp.write(b''.join(encoded) or b'\0')
+
+
+class _ListColumnBuilder(object):
+    # CSR layout: the values of issue i are values[offsets[i]:offsets[i + 1]]
+
+    def __init__(self, *names):
+        self.names = names
+        self.offsets = [0]
+        self.values = {name: [] for name in names}
+
+    def add(self, rows):
+        for row in rows:
+            for name, value in zip(self.names, row):
+                self.values[name].append(value)
+        self.offsets.append(len(self.values[self.names[0]]))
+
+    def save(self, store_dir, prefix, dtypes):
+        np.save(os.path.join(store_dir, prefix + '_offsets.npy'), np.array(self.offsets, dtype=np.int64))
+        for name, dtype in zip(self.names, dtypes):
+            np.save(os.path.join(store_dir, prefix + '_' + name + '.npy'), np.array(self.values[name], dtype=dtype))
+
+
+def convert_issue_cache(json_path, store_dir):
+    """
+    Convert a jira_cache issue_cache.json into the compact store read by CompactIssueStore.
+
+    Only the fields used by the pipeline are kept. Strings are interned into one string
+    table and dates are stored as epoch milliseconds.
+    """
+    with open(json_path) as fp:
+        raw_issues = json.load(fp)
+
+    strings = _StringTableBuilder()
+    projects = []
+    columns = {name: [] for name in ['key', 'key_code', 'issuetype', 'summary', 'description', 'created',
+                                     'created_tz', 'resolutiondate', 'resolutiondate_tz', 'comment_total']}
+    versions = _ListColumnBuilder('name')
+    fix_versions = _ListColumnBuilder('name')
+    components = _ListColumnBuilder('name')
+    comments = _ListColumnBuilder('author', 'body')
+    attachments = _ListColumnBuilder('filename', 'size')
+    links = _ListColumnBuilder('type_name', 'inward', 'outward', 'inward_key', 'outward_key')
+
+    for raw in raw_issues:
+        fields = raw.get('fields', {})
+        columns['key'].append(strings.add(raw['key']))
+        project, number = split_key(raw['key'])
+        if number is None:
+            columns['key_code'].append(NO_KEY_CODE)
+        else:
+            if project not in projects:
+                projects.append(project)
+            columns['key_code'].append(projects.index(project) << KEY_NUMBER_BITS | number)
+
+        issuetype = fields.get('issuetype') or {}
+        columns['issuetype'].append(strings.add(issuetype.get('name')))
+        columns['summary'].append(strings.add(fields.get('summary')))
+        columns['description'].append(strings.add(fields.get('description')))
+        for name in ['created', 'resolutiondate']:
+            epoch_ms, offset = parse_jira_date(fields.get(name))
+            columns[name].append(epoch_ms)
+            columns[name + '_tz'].append(offset)
+
+        versions.add([(strings.add(v.get('name')),) for v in fields.get('versions') or []])
+        fix_versions.add([(strings.add(v.get('name')),) for v in fields.get('fixVersions') or []])
+        components.add([(strings.add(c.get('name')),) for c in fields.get('components') or []])
+
+        comment = fields.get('comment') or {}
+        total = comment.get('total')
+        columns['comment_total'].append(NO_STRING if total is None else total)
+        comments.add([(strings.add((c.get('author') or {}).get('name')), strings.add(c.get('body')))
+                      for c in comment.get('comments') or []])
+        attachments.add([(strings.add(a.get('filename')), a.get('size') or 0)
+                         for a in fields.get('attachment') or []])
+        links.add([(strings.add(link['type'].get('name')),
+                    strings.add(link['type'].get('inward')),
+                    strings.add(link['type'].get('outward')),
+                    strings.add((link.get('inwardIssue') or {}).get('key')),
+                    strings.add((link.get('outwardIssue') or {}).get('key')))
+                   for link in fields.get('issuelinks') or []])
+
+    # build into a sibling directory and swap it in, so readers never see a half written store
+    tmp_dir = store_dir.rstrip('/') + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    strings.save(tmp_dir)
+    int32_columns = ['key', 'issuetype', 'summary', 'description', 'comment_total']
+    for name in int32_columns:
+        np.save(os.path.join(tmp_dir, name + '.npy'), np.array(columns[name], dtype=np.int32))
+    for name in ['created', 'resolutiondate']:
+        np.save(os.path.join(tmp_dir, name + '.npy'), np.array(columns[name], dtype=np.int64))
+        np.save(os.path.join(tmp_dir, name + '_tz.npy'), np.array(columns[name + '_tz'], dtype=np.int16))
+    key_code = np.array(columns['key_code'], dtype=np.int64)
+    key_rows = np.argsort(key_code, kind='stable').astype(np.int32)
+    np.save(os.path.join(tmp_dir, 'key_code.npy'), key_code[key_rows])
+    np.save(os.path.join(tmp_dir, 'key_rows.npy'), key_rows)
+
+    versions.save(tmp_dir, 'versions', [np.int32])
+    fix_versions.save(tmp_dir, 'fixVersions', [np.int32])
+    components.save(tmp_dir, 'components', [np.int32])
+    comments.save(tmp_dir, 'comment', [np.int32, np.int32])
+    attachments.save(tmp_dir, 'attachment', [np.int32, np.int64])
+    links.save(tmp_dir, 'issuelinks', [np.int32] * 5)
+
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as fp:
+        json.dump({'version': STORE_VERSION, 'count': len(raw_issues), 'projects': projects}, fp)
+
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.rename(tmp_dir, store_dir)
+
+
+class _Named(object):
+    # stands in for the jira IssueType/Version/Component resources, which print as their name
+    __slots__ = ['name']
+
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return str(self.name)
+
+    def __repr__(self):
+        return '<%s>' % self.name
+
+
+class _Record(object):
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class CompactIssue(object):
+    """
+    Issue read from a CompactIssueStore. Mirrors the parts of jira.Issue the scripts use:
+    issue.key and issue.fields.<issuetype, created, resolutiondate, versions, fixVersions,
+    components, summary, description, comment, attachment, issuelinks>.
+    """
+
+    def __init__(self, store, row):
+        self._store = store
+        self.row = row
+        self.key = store.string(store.columns['key'][row])
+        self._fields = None
+
+    @property
+    def fields(self):
+        if self._fields is None:
+            self._fields = _Fields(self._store, self.row)
+        return self._fields
+
+    def __repr__(self):
+        return '<CompactIssue %s>' % self.key
+
+
+class CompactIssueStore(object):
+    """
+    Memory-mapped, columnar issue store written by convert_issue_cache.
+
+    Every column is a .npy file opened with mmap_mode='r', so loading only maps the files and
+    forked or spawned workers share the same pages through the OS page cache. Offers the same
+    lookup interface as IssueStore.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, 'meta.json')) as fp:
+            meta = json.load(fp)
+        if meta['version'] != STORE_VERSION:
+            raise ValueError("Unsupported issue store version %s in %s" % (meta['version'], store_dir))
+        self.projects = meta['projects']
+        self._count = meta['count']
+
+        self.columns = {}
+        for file_name in os.listdir(store_dir):
+            if file_name.endswith('.npy'):
+                column = np.load(os.path.join(store_dir, file_name), mmap_mode='r')
+                # plain ndarray view on the mapped buffer, slicing a np.memmap is several times slower
+                self.columns[file_name[:-len('.npy')]] = column.view(np.ndarray)
+        with open(os.path.join(store_dir, 'strings.bin'), 'rb') as fp:
+            self._blob = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self._string_offsets = self.columns.pop('string_offsets')
+        self._strings = {}
+
+    @classmethod
+    def load(cls, store_dir):
+        return cls(store_dir)
+
+    def __reduce__(self):
+        # workers re-map the files instead of receiving a pickled copy of the columns
+        return self.__class__, (self.store_dir,)
+
+    def string(self, string_id):
+        if string_id == NO_STRING:
+            return None
+        string = self._strings.get(string_id)
+        if string is None:
+            start, end = self._string_offsets[string_id], self._string_offsets[string_id + 1]
+            string = sys.intern(self._blob[start:end].decode('utf-8'))
+            self._strings[string_id] = string
+        return string
+
+    def row(self, key):
+        project, number = split_key(key) if key is not None else (None, None)
+        if number is None or project not in self.projects:
+            return None
+        code = self.projects.index(project) << KEY_NUMBER_BITS | number
+        key_code = self.columns['key_code']
+        i = np.searchsorted(key_code, code)
+        if i < len(key_code) and key_code[i] == code:
+            return int(self.columns['key_rows'][i])
+        return None
+
+    def get(self, key, default=None):
+        row = self.row(key)
+        if row is None:
+            return default
+        return CompactIssue(self, row)
+
+    def timestamp(self, key, field):
+        # epoch milliseconds of a date field ('created', 'resolutiondate'), NAT if unknown
+        row = self.row(key)
+        if row is None:
+            return NAT
+        return int(self.columns[field][row])
+
+    def timestamps(self, keys, field):
+        rows = [self.row(key) for key in keys]
+        found = np.array([row is not None for row in rows], dtype=bool)
+        result = np.full(len(rows), NAT, dtype=np.int64)
+        result[found] = self.columns[field][np.array([row for row in rows if row is not None], dtype=np.int64)]
+        return result
+
+    def __getitem__(self, key):
+        issue = self.get(key)
+        if issue is None:
+            raise KeyError(key)
+        return issue
+
+    def __contains__(self, key):
+        return self.row(key) is not None
+
+    def __iter__(self):
+        for row in range(self._count):
+            yield CompactIssue(self, row)
+
+    def __len__(self):
+        return self._count
+
+    def _list(self, prefix, row, *names):
+        offsets = self.columns[prefix + '_offsets']
+        start, end = offsets[row], offsets[row + 1]
+        return zip(*[self.columns[prefix + '_' + name][start:end].tolist() for name in names])
+
+    def _date(self, name, row):
+        return format_jira_date(self.columns[name][row], self.columns[name + '_tz'][row])
+
+    def _comment(self, row):
+        total = int(self.columns['comment_total'][row])
+        return _Record(total=None if total == NO_STRING else total,
+                       comments=[_Record(author=_Named(self.string(author)), body=self.string(body))
+                                 for author, body in self._list('comment', row, 'author', 'body')])
+
+    def _issuelinks(self, row):
+        s = self.string
+        issuelinks = []
+        for type_name, inward, outward, inward_key, outward_key in self._list('issuelinks', row, 'type_name', 'inward',
+                                                                               'outward', 'inward_key', 'outward_key'):
+            link_type = _Record(name=s(type_name), inward=s(inward), outward=s(outward))
+            raw = {'type': {'name': link_type.name, 'inward': link_type.inward, 'outward': link_type.outward}}
+            link = _Record(type=link_type, raw=raw)
+            if inward_key != NO_STRING:
+                link.inwardIssue = _Record(key=s(inward_key))
+                raw['inwardIssue'] = {'key': link.inwardIssue.key}
+            if outward_key != NO_STRING:
+                link.outwardIssue = _Record(key=s(outward_key))
+                raw['outwardIssue'] = {'key': link.outwardIssue.key}
+            issuelinks.append(link)
+        return issuelinks
+
+    def field(self, name, row):
+        s = self.string
+        if name == 'issuetype':
+            return _Named(s(self.columns['issuetype'][row]))
+        if name in ('summary', 'description'):
+            return s(self.columns[name][row])
+        if name in ('created', 'resolutiondate'):
+            return self._date(name, row)
+        if name in ('versions', 'fixVersions', 'components'):
+            return [_Named(s(string_id)) for string_id, in self._list(name, row, 'name')]
+        if name == 'comment':
+            return self._comment(row)
+        if name == 'attachment':
+            return [_Record(filename=s(filename), size=size)
+                    for filename, size in self._list('attachment', row, 'filename', 'size')]
+        if name == 'issuelinks':
+            return self._issuelinks(row)
+        raise AttributeError("Field '%s' is not kept in the compact issue store" % name)
+
+
+class _Fields(object):
+    # issue.fields, every field is decoded on first access only
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        value = self._store.field(name, self._row)
+        setattr(self, name, value)
+        return value
+
+
+def load_cached_issues(jira_path):
+    """
+    Load the issues cached in jira_path, preferring the compact store. The compact store is
+    (re)built from issue_cache.json whenever it is missing or older than the json cache.
+    """
+    json_path = os.path.join(jira_path, 'issue_cache.json')
+    store_dir = os.path.join(jira_path, 'issue_store')
+    meta_path = os.path.join(store_dir, 'meta.json')
+    if os.path.isfile(json_path):
+        if not os.path.isfile(meta_path) or os.path.getmtime(meta_path) < os.path.getmtime(json_path):
+            print("Converting " + json_path + " to compact issue store...")
+            convert_issue_cache(json_path, store_dir)
+    if os.path.isfile(meta_path):
+        return CompactIssueStore.load(store_dir)
+    return IssueStore.load(json_path)
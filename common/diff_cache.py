@@ -0,0 +1,53 @@
+import hashlib
+
+from common.disk_cache import DiskCache, DEFAULT_MAX_BYTES
+from common.git_stream import GitStream
+
+# bump when the stored format changes, old entries then simply stop matching
+CACHE_VERSION = 1
+
+
+def normalize_options(options):
+    # the order of diff options does not change the output
+    return tuple(sorted(set(options)))
+
+
+def cache_key(sha, parent, options):
+    key = '%d %s %s %s' % (CACHE_VERSION, sha, parent, ' '.join(normalize_options(options)))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class DiffCache(DiskCache):
+    """
+    Persistent cache of commit diffs, keyed by (sha, parent, diff options) and stored zlib
+    compressed under directory, one file per diff. Commits are content addressed, so every SZZ
+    variant and every clone of the repository can share one cache.
+
+    The cache is kept below max_bytes by evicting the least recently used entries; reads
+    refresh an entry's mtime. Entries are written atomically, so several processes can use
+    the same directory.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        super(DiffCache, self).__init__(directory, max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sha, parent, options):
+        return self.load(cache_key(sha, parent, options))
+
+    def put(self, sha, parent, options, diff):
+        self.store(cache_key(sha, parent, options), diff)
+
+    def diff(self, repo, sha, parent, *options):
+        """
+        Same text as GitStream.of(repo).diff(sha, parent, *options), from the cache if present.
+        """
+        diff = self.get(sha, parent, options)
+        if diff is not None:
+            self.hits += 1
+            return diff
+        self.misses += 1
+        diff = GitStream.of(repo).diff(sha, parent, *options)
+        self.put(sha, parent, options, diff)
+        return diff
@@ -0,0 +1,86 @@
+import os
+import zlib
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# after an eviction the cache is trimmed to this fraction of its budget, so that the next few
+# writes do not trigger another directory scan right away
+EVICTION_TARGET = 0.9
+
+
+class DiskCache(object):
+    """
+    Text values stored zlib compressed under directory, one file per key (a hex digest), kept
+    below max_bytes by evicting the least recently used entries; reads refresh an entry's mtime.
+    Entries are written atomically, so several processes can use the same directory.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = None
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def load(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as fp:
+                data = fp.read()
+            os.utime(path)
+        except (IOError, OSError):
+            return None
+        return zlib.decompress(data).decode('utf-8', 'surrogateescape')
+
+    def store(self, key, text):
+        path = self.path(key)
+        data = zlib.compress(text.encode('utf-8', 'surrogateescape'))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as fp:
+            fp.write(data)
+        try:
+            # an overwritten entry no longer takes up its old size
+            replaced = os.stat(path).st_size
+        except OSError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        if self.size is None:
+            self.size = self.disk_usage()
+        else:
+            self.size += len(data) - replaced
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        # (mtime, size, path) of every entry
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def disk_usage(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        entries = sorted(self.entries())
+        size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICTION_TARGET
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # another process evicted it first
+                pass
+            size -= entry_size
+        self.size = size
@@ -0,0 +1,223 @@
+import os
+import subprocess
+import threading
+
+from git.util import Stats
+
+# diff-tree --stdin echoes lines that are not object names, so this line marks the end of each reply
+END_OF_REPLY = b'\x1eend-of-reply\n'
+
+# what porcelain "git diff" adds on top of the diff-tree defaults
+PORCELAIN_DIFF_OPTIONS = ('-r', '-M')
+
+STATS_OPTIONS = ('-r', '--root', '--raw', '--numstat', '--no-renames')
+
+RENAME_OPTIONS = PORCELAIN_DIFF_OPTIONS + ('--name-status', '--diff-filter=R')
+
+
+def _decode(output):
+    # same decoding GitPython applies to command output, including the stripped trailing newline
+    output = output.decode('utf-8', 'surrogateescape')
+    return output[:-1] if output.endswith('\n') else output
+
+
+def parse_stats(output):
+    # --raw lines come first, then the --numstat lines of the same files in the same order
+    lines = output.splitlines()
+    raw_lines = [line for line in lines if line.startswith(':')]
+    numstat_lines = lines[len(raw_lines):]
+    total = {"insertions": 0, "deletions": 0, "lines": 0, "files": 0}
+    files = {}
+    for raw_line, numstat_line in zip(raw_lines, numstat_lines):
+        change_type = raw_line.split('\t')[0][-1]
+        raw_insertions, raw_deletions, filename = numstat_line.split('\t')
+        insertions = int(raw_insertions) if raw_insertions != '-' else 0
+        deletions = int(raw_deletions) if raw_deletions != '-' else 0
+        total["insertions"] += insertions
+        total["deletions"] += deletions
+        total["lines"] += insertions + deletions
+        total["files"] += 1
+        files[filename.strip()] = {"insertions": insertions, "deletions": deletions,
+                                   "lines": insertions + deletions, "change_type": change_type}
+    return Stats(total, files)
+
+
+class _BatchProcess(object):
+    """One long-lived git process answering requests written to its stdin, in order."""
+
+    def __init__(self, repo_dir, args):
+        self.process = subprocess.Popen(['git'] + list(args), cwd=repo_dir, stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE)
+        self.lock = threading.Lock()
+
+    def write(self, request):
+        self.process.stdin.write(request)
+        self.process.stdin.flush()
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+
+
+class _DiffTreeProcess(_BatchProcess):
+
+    def __init__(self, repo_dir, options):
+        super(_DiffTreeProcess, self).__init__(repo_dir, ['diff-tree', '--stdin', '--no-commit-id'] + list(options))
+
+    @staticmethod
+    def request(sha, parent):
+        # "<commit> <parent>" diffs the commit against that parent only, a lone commit is a root commit
+        line = sha if parent is None else sha + ' ' + parent
+        return line.encode('ascii') + b'\n' + END_OF_REPLY
+
+    def read_reply(self):
+        chunks = []
+        for line in iter(self.process.stdout.readline, b''):
+            if line == END_OF_REPLY:
+                return b''.join(chunks)
+            chunks.append(line)
+        raise EOFError("git diff-tree exited unexpectedly")
+
+    def diff(self, sha, parent):
+        with self.lock:
+            self.write(self.request(sha, parent))
+            return self.read_reply()
+
+    def diff_many(self, pairs):
+        # pipelined: a writer thread queues every request while the replies are read back, so the
+        # process never waits for a round trip
+        pairs = list(pairs)
+        with self.lock:
+            writer = threading.Thread(target=self._write_all, args=(pairs,))
+            writer.start()
+            try:
+                for _ in pairs:
+                    yield self.read_reply()
+            finally:
+                writer.join()
+
+    def _write_all(self, pairs):
+        for sha, parent in pairs:
+            self.process.stdin.write(self.request(sha, parent))
+        self.process.stdin.flush()
+
+
+class _CatFileProcess(_BatchProcess):
+
+    def __init__(self, repo_dir):
+        super(_CatFileProcess, self).__init__(repo_dir, ['cat-file', '--batch'])
+
+    def read(self, rev):
+        with self.lock:
+            self.write(rev.encode('utf-8') + b'\n')
+            header = self.process.stdout.readline().split()
+            if len(header) != 3:
+                raise ValueError("git object not found: " + rev)
+            _, object_type, size = header
+            content = self.process.stdout.read(int(size))
+            self.process.stdout.read(1)
+            return object_type.decode('ascii'), content
+
+
+class _CatFileCheckProcess(_BatchProcess):
+
+    def __init__(self, repo_dir):
+        super(_CatFileCheckProcess, self).__init__(repo_dir, ['cat-file', '--batch-check=%(objectname)'])
+
+    def object_id(self, rev):
+        with self.lock:
+            self.write(rev.encode('utf-8') + b'\n')
+            reply = self.process.stdout.readline().decode('utf-8', 'surrogateescape').rstrip('\n')
+            # unknown names are reported as "<rev> missing" (or "ambiguous")
+            return None if ' ' in reply else reply
+
+
+class GitStream(object):
+    """
+    Git access through long-lived `git cat-file --batch` and `git diff-tree --stdin` processes.
+
+    Every repo.git.diff() or commit.stats call starts a new git process; here each request is a
+    line written to a process that stays up for the whole run, one per set of diff options.
+    Streams are per process (see GitStream.of), forked pool workers open their own.
+    """
+
+    _streams = {}
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.repo_dir = repo.working_tree_dir or repo.git_dir
+        self._diff_trees = {}
+        self._cat_file = None
+        self._cat_file_check = None
+
+    @classmethod
+    def of(cls, repo):
+        # pipes must not be shared with a forked child, so streams are keyed by pid as well
+        key = (os.getpid(), repo.git_dir)
+        stream = cls._streams.get(key)
+        if stream is None:
+            stream = cls._streams[key] = cls(repo)
+        return stream
+
+    def _diff_tree(self, options):
+        options = tuple(options)
+        process = self._diff_trees.get(options)
+        if process is None:
+            process = self._diff_trees[options] = _DiffTreeProcess(self.repo_dir, options)
+        return process
+
+    def read_object(self, rev):
+        # (type, content bytes) of any object
+        if self._cat_file is None:
+            self._cat_file = _CatFileProcess(self.repo_dir)
+        return self._cat_file.read(rev)
+
+    def object_id(self, rev):
+        # sha of the object rev names (e.g. "sha:path"), None if there is none
+        if self._cat_file_check is None:
+            self._cat_file_check = _CatFileCheckProcess(self.repo_dir)
+        return self._cat_file_check.object_id(rev)
+
+    def parents(self, sha):
+        _, content = self.read_object(sha)
+        header = content.split(b'\n\n', 1)[0]
+        return [line[len(b'parent '):].decode('ascii') for line in header.split(b'\n') if line.startswith(b'parent ')]
+
+    def diff(self, sha, parent, *options):
+        """
+        Patch between parent and sha, the same text repo.git.diff(*options, parent, sha) returns.
+        """
+        process = self._diff_tree(PORCELAIN_DIFF_OPTIONS + ('-p',) + options)
+        return _decode(process.diff(sha, parent))
+
+    def diffs(self, pairs, *options):
+        process = self._diff_tree(PORCELAIN_DIFF_OPTIONS + ('-p',) + options)
+        for output in process.diff_many(pairs):
+            yield _decode(output)
+
+    def stats(self, commit):
+        # same numbers as commit.stats: against the first parent, or everything for a root commit
+        parent = commit.parents[0].hexsha if commit.parents else None
+        return parse_stats(_decode(self._diff_tree(STATS_OPTIONS).diff(commit.hexsha, parent)))
+
+    def stats_many(self, commits):
+        pairs = [(commit.hexsha, commit.parents[0].hexsha if commit.parents else None) for commit in commits]
+        for output in self._diff_tree(STATS_OPTIONS).diff_many(pairs):
+            yield parse_stats(_decode(output))
+
+    def renames(self, sha, parent):
+        # [(old path, new path)] of the files "git diff parent sha" shows as renamed
+        output = _decode(self._diff_tree(RENAME_OPTIONS).diff(sha, parent))
+        return [tuple(line.split('\t')[1:3]) for line in output.split('\n') if line.startswith('R')]
+
+    def close(self):
+        for process in self._diff_trees.values():
+            process.close()
+        if self._cat_file is not None:
+            self._cat_file.close()
+        if self._cat_file_check is not None:
+            self._cat_file_check.close()
+        self._diff_trees = {}
+        self._cat_file = None
+        self._cat_file_check = None
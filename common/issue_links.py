@@ -0,0 +1,79 @@
+import json
+import os
+
+from common.issue_store import normalize_key
+
+# inward names of the link types developers use to point a bugfix at the issue that introduced the bug
+CAUSE_LINK_TYPES = ("is caused by", "is broken by")
+
+
+def causing_keys(issue):
+    # same walk over the issue links the graph scripts did for every vertex
+    links = [link for link in issue.fields.issuelinks if link.type.inward in CAUSE_LINK_TYPES]
+    return [link.inwardIssue.key for link in links if "inwardIssue" in link.raw.keys()]
+
+
+class IssueLinkIndex(object):
+    """
+    "is caused by" / "is broken by" relations between the cached JIRA issues, in both directions.
+
+    caused_by(key) lists the issues an issue was caused by, in the order JIRA lists the links;
+    causes(key) lists the issues it caused. Lookups accept the same key aliases as IssueStore.
+    """
+
+    def __init__(self, caused_by=None):
+        self._caused_by = caused_by if caused_by is not None else {}
+        self._causes = {}
+        for key, causes in self._caused_by.items():
+            for cause in causes:
+                self._causes.setdefault(normalize_key(cause), []).append(key)
+
+    @classmethod
+    def build(cls, issues):
+        caused_by = {}
+        for issue in issues:
+            causes = causing_keys(issue)
+            if causes:
+                # keep the first occurrence, like IssueStore
+                caused_by.setdefault(normalize_key(issue.key), causes)
+        return cls(caused_by)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as fp:
+            return cls(json.load(fp))
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as fp:
+            json.dump(self._caused_by, fp)
+        os.replace(tmp_path, path)
+
+    def caused_by(self, key):
+        if key is None:
+            return []
+        return self._caused_by.get(normalize_key(key), [])
+
+    def causes(self, key):
+        if key is None:
+            return []
+        return self._causes.get(normalize_key(key), [])
+
+    def __len__(self):
+        return len(self._caused_by)
+
+
+def load_issue_links(jira_path, issues):
+    """
+    Load the link index stored next to the issue cache in jira_path, building it from issues
+    when it is missing or older than issue_cache.json.
+    """
+    json_path = os.path.join(jira_path, 'issue_cache.json')
+    links_path = os.path.join(jira_path, 'issue_links.json')
+    if os.path.isfile(links_path) and (not os.path.isfile(json_path) or
+                                       os.path.getmtime(links_path) >= os.path.getmtime(json_path)):
+        return IssueLinkIndex.load(links_path)
+    print("Indexing issue links...")
+    links = IssueLinkIndex.build(issues)
+    links.save(links_path)
+    return links
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from jira_cache import CachedIssues
+
+# timestamps are epoch milliseconds, missing dates (e.g. unresolved issues) are NAT
+NAT = np.iinfo(np.int64).min
+
+JIRA_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f%z'
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def normalize_key(key):
+    # "HIVE_123" -> "HIVE-123", the one alias the scripts ever matched an issue key by; the case and
+    # any other separator ("hive-123", "HIVE,123") must be the issue key's own
+    return key.replace('_', '-', 1)
+
+
+def parse_jira_date(date_string):
+    # "2015-01-10T10:11:12.000+0100" -> (epoch milliseconds, utc offset in minutes)
+    if date_string is None:
+        return NAT, 0
+    parsed = datetime.strptime(date_string, JIRA_DATE_FORMAT)
+    offset = parsed.utcoffset()
+    return (parsed - EPOCH) // timedelta(milliseconds=1), int(offset.total_seconds() // 60)
+
+
+class IssueStore(object):
+    """
+    Read-only view over the cached JIRA issues with O(1) lookups by issue key.
+
+    The issues are loaded once; lookups accept both the canonical key ("HIVE-123")
+    and its "HIVE_123" alias. The "created" and "resolutiondate" fields
+    are also served as epoch milliseconds, parsed once per issue.
+    """
+
+    def __init__(self, issues):
+        self.issues = list(issues)
+        self._by_key = {}
+        for issue in self.issues:
+            # keep the first occurrence, the old list scans returned jira_issues[0]
+            self._by_key.setdefault(normalize_key(issue.key), issue)
+        self._timestamps = {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as fp:
+            return cls(CachedIssues.load(fp))
+
+    def dump(self, path):
+        with open(path, 'w') as fp:
+            CachedIssues(self.issues).dump(fp)
+
+    def get(self, key, default=None):
+        if key is None:
+            return default
+        return self._by_key.get(normalize_key(key), default)
+
+    def timestamp(self, key, field):
+        # epoch milliseconds of a date field ('created', 'resolutiondate'), NAT if unknown
+        column = self._timestamps.get(field)
+        if column is None:
+            column = {k: parse_jira_date(getattr(issue.fields, field))[0] for k, issue in self._by_key.items()}
+            self._timestamps[field] = column
+        if key is None:
+            return NAT
+        return column.get(normalize_key(key), NAT)
+
+    def timestamps(self, keys, field):
+        return np.array([self.timestamp(key, field) for key in keys], dtype=np.int64)
+
+    def __getitem__(self, key):
+        issue = self.get(key)
+        if issue is None:
+            raise KeyError(key)
+        return issue
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __iter__(self):
+        return iter(self.issues)
+
+    def __len__(self):
+        return len(self.issues)
@@ -0,0 +1,213 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from jira import JIRAError
+
+SEARCH_PATH = '/rest/api/2/search'
+FETCH_STATE_FILE = 'fetch_state.json'
+
+# bytes read at a time when looking for the last complete line of a journal
+JOURNAL_TAIL_CHUNK = 64 * 1024
+
+
+def append_to_journal(journal_path, raw_issues):
+    """
+    Append raw issues to the journal at journal_path, one JSON line each, and fsync it. A torn
+    last line, left by a process killed while journaling, is cut off first: its page was not
+    checkpointed, so it is fetched and written again.
+    """
+    with open(journal_path, 'ab+') as journal:
+        end = journal.seek(0, os.SEEK_END)
+        if end:
+            journal.seek(end - 1)
+            if journal.read(1) != b'\n':
+                journal.truncate(_last_line_end(journal, end))
+        for raw_issue in raw_issues:
+            journal.write(json.dumps(raw_issue).encode('utf-8') + b'\n')
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+def _last_line_end(journal, end):
+    # offset just past the last newline before end, 0 if there is none
+    while end > 0:
+        start = max(0, end - JOURNAL_TAIL_CHUNK)
+        journal.seek(start)
+        newline = journal.read(end - start).rfind(b'\n')
+        if newline >= 0:
+            return start + newline + 1
+        end = start
+    return 0
+
+
+class AdaptiveLimiter(object):
+    """
+    Caps the number of requests in flight and adapts that cap to the server (AIMD): every
+    successful request raises it by one step up to max_concurrency, a 429 halves it and makes
+    all workers wait out the Retry-After delay before sending anything again.
+    """
+
+    def __init__(self, max_concurrency, min_backoff=1.0, max_backoff=60.0):
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max_concurrency)
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.in_flight = 0
+        self.resume_at = 0.0
+        self.throttled = 0
+        self._backoff = min_backoff
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while True:
+                wait = self.resume_at - time.time()
+                if wait <= 0 and self.in_flight < int(self.concurrency):
+                    self.in_flight += 1
+                    return
+                self._condition.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, throttled=False, retry_after=None):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self.concurrency = max(1.0, self.concurrency / 2)
+                delay = retry_after if retry_after is not None else self._backoff
+                self._backoff = min(self.max_backoff, self._backoff * 2)
+                self.resume_at = max(self.resume_at, time.time() + delay)
+            else:
+                self.concurrency = min(float(self.max_concurrency), self.concurrency + 1.0 / max(1.0, self.concurrency))
+                self._backoff = self.min_backoff
+            self._condition.notify_all()
+
+
+def _retry_after(response):
+    value = response.headers.get('Retry-After')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ConcurrentIssueFetcher(object):
+    """
+    Downloads all issues of a project with several search requests in flight.
+
+    The key space PROJECT-1..PROJECT-<max> is cut into ranges of page_size keys and every range
+    is one task: "project = X AND key >= X-a AND key < X-b ORDER BY key". Unlike startAt
+    offsets over a single query, these ranges do not shift when issues are edited while the
+    download runs. Requests share one keep-alive connection pool of `workers` connections.
+    """
+
+    def __init__(self, server, project, page_size=100, workers=8, max_attempts=10, session=None):
+        self.url = server.rstrip('/') + SEARCH_PATH
+        self.project = project
+        self.page_size = page_size
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.limiter = AdaptiveLimiter(workers)
+        self.requests = 0
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+
+    def search(self, jql, start_at=0, max_results=None):
+        params = {'jql': jql, 'startAt': start_at, 'maxResults': max_results or self.page_size, 'fields': '*all'}
+        for attempt in range(self.max_attempts):
+            self.limiter.acquire()
+            try:
+                response = self.session.get(self.url, params=params)
+            except requests.RequestException:
+                self.limiter.release(throttled=True)
+                if attempt == self.max_attempts - 1:
+                    raise
+                continue
+            self.requests += 1
+            if response.status_code == 429 or response.status_code == 503:
+                self.limiter.release(throttled=True, retry_after=_retry_after(response))
+                continue
+            self.limiter.release()
+            if response.status_code != 200:
+                raise JIRAError(text=response.text, status_code=response.status_code, url=self.url)
+            return response.json()
+        raise JIRAError(text="Still rate limited after %d attempts" % self.max_attempts, status_code=429, url=self.url)
+
+    def probe(self):
+        # newest update and highest issue number, bounding the download
+        newest = self.search('project=' + self.project + ' ORDER BY updated DESC', max_results=1)['issues']
+        highest = self.search('project=' + self.project + ' ORDER BY key DESC', max_results=1)['issues']
+        if not newest:
+            return None, 0
+        return newest[0]['fields']['updated'], int(highest[0]['key'].rsplit('-', 1)[1])
+
+    def fetch_range(self, low, high):
+        jql = ('project=%s AND key >= %s-%d AND key < %s-%d ORDER BY key ASC'
+               % (self.project, self.project, low, self.project, high))
+        issues = []
+        while True:
+            result = self.search(jql, start_at=len(issues))
+            issues.extend(result['issues'])
+            # the server may cap maxResults below page_size
+            if not result['issues'] or len(issues) >= result['total']:
+                return issues
+
+    def fetch_all(self, ranges, on_page):
+        """
+        Fetch every (low, high) key range, handing each page to on_page(low, issues) as soon
+        as it arrives; on_page is called from one thread at a time.
+        """
+        page_lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.fetch_range, low, high): low for low, high in ranges}
+            for future in as_completed(futures):
+                issues = future.result()
+                with page_lock:
+                    on_page(futures[future], issues)
+
+
+def fetch_all_issues(server, project, jira_path, journal_path, page_size=100, workers=8):
+    """
+    Download every issue of the project into the journal at journal_path, page by page.
+
+    Finished ranges are checkpointed in <jira_path>/fetch_state.json, so an interrupted
+    download only fetches the missing ranges when run again. Returns the "updated" value of
+    the newest issue at the time the download started, the high-water mark for later syncs.
+    """
+    fetcher = ConcurrentIssueFetcher(server, project, page_size=page_size, workers=workers)
+    state_path = os.path.join(jira_path, FETCH_STATE_FILE)
+    if os.path.isfile(state_path):
+        with open(state_path) as fp:
+            state = json.load(fp)
+    else:
+        newest, highest = fetcher.probe()
+        state = {'newest': newest, 'highest': highest, 'page_size': page_size, 'done': []}
+
+    done = set(state['done'])
+    step = state['page_size']
+    ranges = [(low, low + step) for low in range(1, state['highest'] + 1, step) if low not in done]
+    total = len(done) + len(ranges)
+
+    def on_page(low, issues):
+        append_to_journal(journal_path, issues)
+        state['done'].append(low)
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w') as fp:
+            json.dump(state, fp)
+        os.replace(tmp_path, state_path)
+        print("Fetched %d/%d key ranges" % (len(state['done']), total))
+
+    start = time.time()
+    fetcher.fetch_all(ranges, on_page)
+    print("Fetched %d key ranges with %d requests in %.1f s (%d throttled)"
+          % (len(ranges), fetcher.requests, time.time() - start, fetcher.limiter.throttled))
+    if os.path.isfile(state_path):
+        os.remove(state_path)
+    return state['newest']
@@ -0,0 +1,101 @@
+import csv
+import os
+import re
+
+from common.issue_store import normalize_key
+
+# a record separator that cannot appear in commit messages delimits the git log entries
+RECORD_SEPARATOR = '\x1e'
+
+
+def jira_key_pattern(project):
+    # same pattern the scripts used per commit, compiled once per project
+    return re.compile('(' + project.upper() + '[-,_]{1}[0-9]+|HADOOP[-,_]{1}[0-9]+)', re.IGNORECASE)
+
+
+def extract_jira_key(message, pattern):
+    result = pattern.search(message)
+    if result is not None:
+        return normalize_key(result.group(0))
+    else:
+        return None
+
+
+def read_commit_messages(repo, rev='HEAD'):
+    # (sha, message) of every commit reachable from rev, in repo.iter_commits() order, from one git call
+    log = repo.git.log('--format=' + RECORD_SEPARATOR + '%H%n%B', rev)
+    for record in log.split(RECORD_SEPARATOR)[1:]:
+        sha, _, message = record.partition('\n')
+        yield sha, message
+
+
+class JiraKeyIndex(object):
+    """
+    sha -> JIRA key of every commit, extracted in one pass over all commit messages.
+
+    Commits without a JIRA key map to None, so the index also knows which commits were
+    scanned. The mapping is persisted as a csv file and only new commits are scanned when
+    it is built again.
+    """
+
+    def __init__(self, project, keys=None):
+        self.project = project
+        self.pattern = jira_key_pattern(project)
+        self.keys = keys if keys is not None else {}
+
+    @classmethod
+    def build(cls, repo, project, path=None, messages=None):
+        # messages: (sha, message) pairs already read by the caller, e.g. CommitTable.build
+        index = cls.load(project, path) if path is not None and os.path.isfile(path) else cls(project)
+        if messages is None:
+            messages = read_commit_messages(repo)
+        keys = {}
+        scanned = 0
+        for sha, message in messages:
+            if sha in index.keys:
+                keys[sha] = index.keys[sha]
+            else:
+                keys[sha] = extract_jira_key(message, index.pattern)
+                scanned += 1
+        # keep the order of the history, newest commit first
+        index.keys = keys
+        if path is not None and scanned:
+            index.save(path)
+        return index
+
+    @classmethod
+    def load(cls, project, path):
+        with open(path) as fp:
+            reader = csv.DictReader(fp)
+            return cls(project, {row['sha']: row['jira_key'] or None for row in reader})
+
+    def save(self, path):
+        with open(path, 'w') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(['sha', 'jira_key'])
+            for sha, key in self.keys.items():
+                writer.writerow([sha, key or ''])
+
+    def get(self, sha, message=None):
+        # commits newer than the index fall back to scanning their message
+        if sha in self.keys:
+            return self.keys[sha]
+        if message is not None:
+            return extract_jira_key(message, self.pattern)
+        return None
+
+    def key_of(self, commit):
+        # GitPython commit, its message is only loaded if the commit is newer than the index
+        if commit.hexsha in self.keys:
+            return self.keys[commit.hexsha]
+        return extract_jira_key(commit.message, self.pattern)
+
+    def items(self):
+        # (sha, key) of the commits that reference a JIRA issue
+        return ((sha, key) for sha, key in self.keys.items() if key is not None)
+
+    def __contains__(self, sha):
+        return sha in self.keys
+
+    def __len__(self):
+        return len(self.keys)
@@ -0,0 +1,159 @@
+import json
+import os
+from datetime import datetime
+
+from common.jira_fetch import append_to_journal, fetch_all_issues
+
+# JQL only understands minutes, in the time zone the server renders dates in
+JQL_DATE_FORMAT = '%Y/%m/%d %H:%M'
+JIRA_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f%z'
+
+CACHE_FILE = 'issue_cache.json'
+JOURNAL_FILE = 'issue_cache.journal.jsonl'
+STATE_FILE = 'sync_state.json'
+
+
+def updated_datetime(raw_issue):
+    return datetime.strptime(raw_issue['fields']['updated'], JIRA_DATE_FORMAT)
+
+
+def updated_minute(raw_issue):
+    # "2016-01-01T10:11:12.000+0000" -> "2016/01/01 10:11", kept in the offset the server used
+    return updated_datetime(raw_issue).strftime(JQL_DATE_FORMAT)
+
+
+def build_jql(project, since):
+    jql = 'project=' + project
+    if since is not None:
+        jql += ' AND updated >= "' + since + '"'
+    # issues edited during the sync move to the end of this order, so pages never have to go back
+    return jql + ' ORDER BY updated ASC, key ASC'
+
+
+def _write_json_atomically(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as fp:
+        json.dump(data, fp)
+    os.replace(tmp_path, path)
+
+
+class SyncState(object):
+    """
+    Progress of an incremental sync, stored in <jira_path>/sync_state.json.
+
+    since is the high-water mark: the "updated" minute of the newest issue that made it
+    into the local store. skip counts the issues of that very minute that were already
+    fetched, so an interrupted sync continues at the right spot even if one minute holds
+    more issues than a page.
+    """
+
+    def __init__(self, path, since=None, skip=0):
+        self.path = path
+        self.since = since
+        self.skip = skip
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.isfile(path):
+            return cls(path)
+        with open(path) as fp:
+            state = json.load(fp)
+        return cls(path, since=state['since'], skip=state['skip'])
+
+    def save(self):
+        _write_json_atomically(self.path, {'since': self.since, 'skip': self.skip})
+
+    def advance(self, page):
+        last_minute = updated_minute(page[-1])
+        if last_minute == self.since:
+            self.skip += len(page)
+        else:
+            self.since = last_minute
+            self.skip = sum(1 for raw_issue in page if updated_minute(raw_issue) == last_minute)
+
+
+def fetch_page(jira, jql, start_at, page_size):
+    result = jira.search_issues(jql, startAt=start_at, maxResults=page_size, fields="*all", json_result=True)
+    return result['issues']
+
+
+def merge_journal(jira_path):
+    """
+    Fold the pages journaled by sync_issues into issue_cache.json. Newer versions of an
+    issue (by their "updated" date) replace older ones, new issues are appended.
+    """
+    cache_path = os.path.join(jira_path, CACHE_FILE)
+    journal_path = os.path.join(jira_path, JOURNAL_FILE)
+    if not os.path.isfile(journal_path):
+        return 0
+
+    issues = {}
+    if os.path.isfile(cache_path):
+        with open(cache_path) as fp:
+            for raw_issue in json.load(fp):
+                issues[raw_issue['key']] = raw_issue
+    merged = 0
+    with open(journal_path) as fp:
+        for line in fp:
+            # a torn last line means we were killed while journaling, that page is fetched again
+            # (and the line cut off by append_to_journal if the fetch resumed)
+            if not line.endswith('\n'):
+                break
+            raw_issue = json.loads(line)
+            # pages fetched concurrently are journaled out of order
+            old = issues.get(raw_issue['key'])
+            if old is None or updated_datetime(raw_issue) >= updated_datetime(old):
+                issues[raw_issue['key']] = raw_issue
+            merged += 1
+
+    _write_json_atomically(cache_path, list(issues.values()))
+    os.remove(journal_path)
+    return merged
+
+
+def sync_issues(jira, project, jira_path, page_size=100, workers=8, fetch=fetch_page):
+    """
+    Bring <jira_path>/issue_cache.json up to date with the JIRA server.
+
+    Without a local cache the whole project is downloaded with fetch_all_issues, using
+    `workers` concurrent requests. Afterwards only issues updated since the last sync are
+    requested. Every page is appended to a journal and the progress is checkpointed right
+    after, so a sync that dies (rate limit, network, ctrl-c) resumes from the last page on
+    the next call. Once the server has no more pages the journal is merged into the cache.
+
+    Returns the number of issues fetched by this call.
+    """
+    state = SyncState.load(os.path.join(jira_path, STATE_FILE))
+    cache_path = os.path.join(jira_path, CACHE_FILE)
+    if state.since is None and os.path.isfile(cache_path):
+        # cache downloaded before syncs were tracked, continue from its newest issue
+        with open(cache_path) as fp:
+            minutes = [updated_minute(raw_issue) for raw_issue in json.load(fp)]
+        state.since = max(minutes, key=lambda minute: datetime.strptime(minute, JQL_DATE_FORMAT), default=None)
+    journal_path = os.path.join(jira_path, JOURNAL_FILE)
+    if state.since is None:
+        newest = fetch_all_issues(jira.server_url, project, jira_path, journal_path,
+                                  page_size=page_size, workers=workers)
+        fetched = merge_journal(jira_path)
+        # everything edited after the download started is picked up by the next sync
+        state.since = None if newest is None else updated_minute({'fields': {'updated': newest}})
+        state.skip = 0
+        state.save()
+        return fetched
+
+    fetched = 0
+    while True:
+        page = fetch(jira, build_jql(project, state.since), state.skip, page_size)
+        if not page:
+            break
+        append_to_journal(journal_path, page)
+        state.advance(page)
+        state.save()
+        fetched += len(page)
+        print("Synced %d issues (up to %s)" % (fetched, state.since))
+
+    merge_journal(jira_path)
+    # the next sync re-reads the last minute from its start, duplicates are merged away
+    state.skip = 0
+    state.save()
+    return fetched
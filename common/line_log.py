@@ -0,0 +1,336 @@
+import bisect
+import re
+import subprocess
+
+from git.exc import GitCommandError
+
+from common.blame_scheduler import run_commands
+from common.git_stream import GitStream
+
+COMMIT_PATTERN = re.compile(r'^commit ([\w\d]{40})', re.MULTILINE)
+COMMIT_LINE_PATTERN = re.compile(rb'^commit ([\w\d]{40})')
+HUNK_HEADER_PATTERN = re.compile(r'^@@ -(\d+),(\d+) \+(\d+),(\d+) @@')
+
+
+class _Block(object):
+    """The diff `git log -L` prints for the tracked range of one commit."""
+
+    def __init__(self, old_path, new_path, old_start, old_count, new_start, new_count):
+        self.old_path = old_path
+        self.new_path = new_path
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_start = new_start
+        self.new_count = new_count
+        self.lines = []
+
+    def hunks(self):
+        """
+        (new_start, new_end, old_start, old_end) of every change, plus {new line: old line} of the
+        unchanged lines. Line numbers are 1-based, ends exclusive.
+        """
+        hunks = []
+        unchanged = {}
+        old, new = self.old_start, self.new_start
+        hunk = None
+        for tag in self.lines:
+            if tag == ' ':
+                if hunk is not None:
+                    hunks.append(tuple(hunk))
+                    hunk = None
+                unchanged[new] = old
+                old += 1
+                new += 1
+            else:
+                if hunk is None:
+                    hunk = [new, new, old, old]
+                if tag == '-':
+                    old += 1
+                    hunk[3] = old
+                else:
+                    new += 1
+                    hunk[1] = new
+        if hunk is not None:
+            hunks.append(tuple(hunk))
+        return hunks, unchanged
+
+
+def parse_line_log(output):
+    """
+    [(sha, [_Block])] of `git log --format='commit %H' -L ...` output, newest commit first. Only
+    the first character of each diff line is kept.
+    """
+    entries = []
+    block = None
+    old_path = new_path = None
+    for line in output.split('\n'):
+        if block is not None and line[:1] in (' ', '-', '+'):
+            block.lines.append(line[0])
+            continue
+        if line.startswith('commit '):
+            entries.append((line[len('commit '):], []))
+            block = None
+        elif line.startswith('--- '):
+            old_path = line[len('--- a/'):] if line != '--- /dev/null' else None
+        elif line.startswith('+++ '):
+            new_path = line[len('+++ b/'):]
+        elif line.startswith('@@ '):
+            match = HUNK_HEADER_PATTERN.match(line)
+            block = _Block(old_path, new_path, *[int(group) for group in match.groups()])
+            entries[-1][1].append(block)
+        elif line.startswith('diff --git'):
+            block = None
+    return entries
+
+
+def touches(hunk, start, end):
+    # same rule as git's line-log: a change touches a range if its new lines overlap the range,
+    # a pure deletion only if it lies strictly inside the range
+    new_start, new_end = hunk[0], hunk[1]
+    if new_start == new_end:
+        return start < new_start < end
+    return new_start < end and start < new_end
+
+
+class LineLog(object):
+    """
+    The commits `git log <options> -L l,l:file rev` lists for every line l of a range, from a
+    single `git log -L start,end:file rev` call.
+
+    git tracks a range through the history by mapping it across every commit that changes it: the
+    unchanged lines move with the diff, changed lines are replaced by the full pre-image of the
+    change. The range query prints that diff for the whole range, so the same mapping can be
+    replayed for each line on its own. Where the replay cannot be exact (merges the range history
+    may have taken differently, unseen renames, unexpected output), the affected range falls back
+    to one query per line, so results are always the same as the per-line queries.
+    """
+
+    def __init__(self, repo, commits, options=()):
+        self.repo = repo
+        self.repo_dir = repo.working_tree_dir or repo.git_dir
+        self.commits = commits
+        self.options = list(options)
+        self.invocations = 0
+        self.fallbacks = 0
+        self._mainline = None
+        self._merge_safety = {}
+        self._merged_paths = None
+        self._prefetched = {}
+
+    def log_args(self, start, end, filename, rev, output_format=None):
+        args = self.options + ([output_format] if output_format else [])
+        return args + ['-L ' + str(start) + ',' + str(end) + ':' + filename, str(rev)]
+
+    def log(self, start, end, filename, rev, output_format=None):
+        args = self.log_args(start, end, filename, rev, output_format)
+        prefetched = self._prefetched.pop(tuple(['git', 'log'] + args), None)
+        if prefetched is None:
+            self.invocations += 1
+            return self.repo.git.log(*args)
+        self.invocations += 1
+        status, stdout, stderr = prefetched
+        if status != 0:
+            raise GitCommandError(['git', 'log'] + args, status, stderr)
+        # as GitPython decodes it
+        output = stdout.decode('utf-8', 'surrogateescape')
+        return output[:-1] if output.endswith('\n') else output
+
+    def prefetch(self, requests, concurrency, reads=None):
+        """
+        Runs the queries histories() is going to make for requests [(ranges, filename, rev)] up
+        front, at most concurrency at a time (see run_commands); histories() then reads their
+        output instead of waiting for git. reads, one per request, is how many of its first lines
+        the caller reads the histories of (None for all); only the ranges of those are queried.
+        Lines that only turn out to need their own query while their range is replayed are still
+        queried when they are reached.
+        """
+        commands = []
+        for (ranges, filename, rev), lines_read in zip(requests, reads or [None] * len(requests)):
+            rev = str(rev)
+            lines = 0
+            for start, count in ranges:
+                if lines_read is not None and lines >= lines_read:
+                    break
+                lines += count
+                if count == 1:
+                    commands.append(['git', 'log'] + self.log_args(start, start, filename, rev))
+                elif count > 1:
+                    head = self._resolve(rev)
+                    if head is not None and not self._merged_into(filename, head):
+                        commands.append(['git', 'log'] + self.log_args(start, start + count - 1, filename, rev,
+                                                                       '--format=commit %H'))
+        # outputs a previous commit did not get to read are dropped; invocations counts the ones read
+        self._prefetched = run_commands(commands, self.repo_dir, concurrency)
+
+    def line_history(self, line, filename, rev):
+        # exactly the old per-line query
+        return COMMIT_PATTERN.findall(self.log(line, line, filename, rev))
+
+    def stream_line_history(self, line, filename, rev):
+        """
+        The shas of line_history(line, filename, rev), read from git's output as it is written.
+        git is stopped as soon as the caller stops reading, so a caller that only needs the newest
+        commit does not wait for the rest of the output. Raises GitCommandError, like the buffered
+        query, if git fails.
+        """
+        self.invocations += 1
+        args = ['git', 'log'] + self.options + ['-L ' + str(line) + ',' + str(line) + ':' + filename, str(rev)]
+        process = subprocess.Popen(args, cwd=self.repo_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        finished = False
+        try:
+            for output_line in process.stdout:
+                match = COMMIT_LINE_PATTERN.match(output_line)
+                if match:
+                    yield match.group(1).decode('ascii')
+            finished = True
+        finally:
+            if not finished:
+                process.kill()
+            process.stdout.close()
+            stderr = process.stderr.read()
+            process.stderr.close()
+            status = process.wait()
+        if status != 0:
+            raise GitCommandError(args, status, stderr)
+
+    def histories(self, start, count, filename, rev):
+        """
+        Yields, for each line in range(start, start + count), the shas the per-line query returns,
+        newest commit first. Lines that need their own query are queried as they are reached, so a
+        failing query (e.g. a line past the end of the file) raises where it did before.
+        """
+        rev = str(rev)
+        histories = None
+        head = self._resolve(rev) if count > 1 else None
+        if head is not None and not self._merged_into(filename, head):
+            try:
+                entries = parse_line_log(self.log(start, start + count - 1, filename, rev, '--format=commit %H'))
+                histories = self._replay(entries, start, count, head)
+            except Exception:
+                # e.g. the range runs past the end of the file, which only some of its lines do
+                histories = None
+            if histories is None:
+                self.fallbacks += 1
+        if histories is not None:
+            for shas in histories:
+                yield shas
+        else:
+            for line in range(start, start + count):
+                if tuple(['git', 'log'] + self.log_args(line, line, filename, rev)) in self._prefetched:
+                    yield self.line_history(line, filename, rev)
+                else:
+                    yield self.stream_line_history(line, filename, rev)
+
+    def file_histories(self, ranges, filename, rev):
+        """
+        Yields (line, shas) for every line of ranges [(start, count)], one range query at a time.
+        """
+        for start, count in ranges:
+            for line, shas in zip(range(start, start + count), self.histories(start, count, filename, rev)):
+                yield line, shas
+
+    def _resolve(self, rev):
+        # sha of rev (e.g. "sha^") if it is on the mainline, the only place the replay starts from
+        mainline = self._mainline_positions()
+        if rev not in mainline:
+            rev = GitStream.of(self.repo).object_id(rev + '^{commit}')
+        return rev if rev in mainline else None
+
+    def _replay(self, entries, start, count, rev):
+        mainline = self._mainline_positions()
+        # [start, end) of each line's tracked range, in the coordinates of the commit being replayed
+        ranges = [(line, line + 1) for line in range(start, start + count)]
+        histories = [[] for _ in range(count)]
+        # the combined range as last seen: (old start, old count) of the previous commit's block
+        combined_start, combined_count = start, count
+        path = None
+        position = mainline[rev]
+        for sha, blocks in entries:
+            if len(blocks) != 1 or len(self.commits.parents[self.commits.rows[sha]]) > 1:
+                return None
+            block = blocks[0]
+            if block.new_count != combined_count:
+                return None
+            if sha not in mainline or mainline[sha] < position or \
+                    not self._merges_safe(position, mainline[sha], block.new_path):
+                return None
+            delta = block.new_start - combined_start
+            hunks, unchanged = block.hunks()
+            for i, (line_start, line_end) in enumerate(ranges):
+                if line_start == line_end:
+                    continue
+                line_start, line_end = line_start + delta, line_end + delta
+                touched = [hunk for hunk in hunks if touches(hunk, line_start, line_end)]
+                if not touched:
+                    ranges[i] = (unchanged[line_start], unchanged[line_start] + line_end - line_start)
+                    continue
+                histories[i].append(sha)
+                old_lines = [unchanged[line] for line in range(line_start, line_end) if line in unchanged]
+                for hunk in touched:
+                    old_lines.extend(range(hunk[2], hunk[3]))
+                if not old_lines:
+                    ranges[i] = (0, 0)
+                elif max(old_lines) - min(old_lines) + 1 != len(set(old_lines)):
+                    return None
+                else:
+                    ranges[i] = (min(old_lines), max(old_lines) + 1)
+            combined_start, combined_count = block.old_start, block.old_count
+            # renames apply to the whole file, every line follows the same path
+            path = block.old_path
+            position = mainline[sha]
+        if combined_count > 0 and (path is None or not self._merges_safe(position, len(self._mainline_order), path)):
+            # the range outlived the listed commits, the rest of the history must not fork either
+            return None
+        return histories
+
+    def _mainline_positions(self):
+        # position of every commit on the first-parent chain of the newest commit
+        if self._mainline is None:
+            order = []
+            sha = self.commits.shas[0] if len(self.commits) else None
+            while sha is not None and sha in self.commits:
+                order.append(sha)
+                parents = self.commits.parents[self.commits.rows[sha]]
+                sha = parents[0] if parents else None
+            self._mainline_order = order
+            self._mainline = {sha: position for position, sha in enumerate(order)}
+            self._merge_positions = [position for position, sha in enumerate(order)
+                                     if len(self.commits.parents[self.commits.rows[sha]]) > 1]
+        return self._mainline
+
+    def _merged_into(self, path, rev):
+        # True if a merge older than rev changed path: the history of some of its lines may fork
+        # there, so the range query would most likely be wasted
+        if self._merged_paths is None:
+            log = self.repo.git.log('--first-parent', '--merges', '-m', '--name-only', '--format=commit %H')
+            self._merged_paths = {}
+            sha = None
+            for line in log.split('\n'):
+                if line.startswith('commit '):
+                    sha = line[len('commit '):]
+                elif line:
+                    self._merged_paths.setdefault(line, []).append(sha)
+        merges = self._merged_paths.get(path)
+        if not merges:
+            return False
+        mainline = self._mainline_positions()
+        return any(mainline.get(merge, -1) >= mainline[rev] for merge in merges)
+
+    def _merges_safe(self, from_position, to_position, path):
+        # every merge in between must leave the file as its first parent had it, so that any range
+        # follows the first parent there, as it does for the combined range
+        first = bisect.bisect_left(self._merge_positions, from_position)
+        last = bisect.bisect_left(self._merge_positions, to_position)
+        for merge_position in self._merge_positions[first:last]:
+            if not self._merge_keeps_file(self._mainline_order[merge_position], path):
+                return False
+        return True
+
+    def _merge_keeps_file(self, merge, path):
+        key = (merge, path)
+        if key not in self._merge_safety:
+            stream = GitStream.of(self.repo)
+            parent = self.commits.parents[self.commits.rows[merge]][0]
+            blob = stream.object_id(merge + ':' + path)
+            self._merge_safety[key] = blob is not None and blob == stream.object_id(parent + ':' + path)
+        return self._merge_safety[key]
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+
+from git.exc import GitCommandError
+
+from common.disk_cache import DiskCache
+from common.git_stream import GitStream
+
+# bump when the stored format or the attribution rules change, old entries then simply stop matching
+INDEX_VERSION = 1
+
+# the index is only complete while nothing is evicted, so the budget is far above its expected size
+DEFAULT_MAX_BYTES = 16 * 1024 ** 3
+
+# file versions kept in memory while the index is built or read
+DEFAULT_CAPACITY = 4096
+
+# the diff options git blame applies; it accepts the other whitespace options but ignores them
+BLAME_DIFF_OPTIONS = ('-w', '--ignore-all-space', '--minimal')
+
+# raw lines give the blobs on both sides, -U0 hunks the lines that changed
+DIFF_OPTIONS = ('--raw', '--no-abbrev', '--root', '-U0')
+
+HUNK_HEADER_PATTERN = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+def parse_changes(output):
+    """
+    {new path: (old path, old blob, new blob, hunks)} of the files a `git diff-tree --raw -p -U0`
+    reply adds or changes. hunks are (old start, old count, new start, new count) as in the hunk
+    headers, None for a file whose lines are not shown (binary).
+    """
+    files = []
+    patches = {}
+    hunks = None
+    for line in output.split('\n'):
+        if line.startswith(':'):
+            fields, _, paths = line.partition('\t')
+            _, _, old_blob, new_blob, status = fields.split(' ')
+            paths = paths.split('\t')
+            files.append((status[0], paths[0], paths[-1], old_blob, new_blob))
+        elif line.startswith('diff --git '):
+            hunks = patches[line] = []
+        elif line.startswith('@@ ') and hunks is not None:
+            old_start, old_count, new_start, new_count = HUNK_HEADER_PATTERN.match(line).groups()
+            hunks.append((int(old_start), 1 if old_count is None else int(old_count),
+                          int(new_start), 1 if new_count is None else int(new_count)))
+        elif line.startswith('Binary files ') and hunks is not None:
+            hunks.append(None)
+    changes = {}
+    for status, old_path, new_path, old_blob, new_blob in files:
+        if status == 'D':
+            continue
+        # whitespace-only changes the blame options ignore have no patch at all
+        file_hunks = patches.get('diff --git a/%s b/%s' % (old_path, new_path), [])
+        if status == 'A':
+            old_path = None
+        changes[new_path] = (old_path, old_blob, new_blob, None if None in file_hunks else file_hunks)
+    return changes
+
+
+def carry(origins, hunks):
+    # the origins of the new side of a change: unchanged lines keep theirs, changed lines get None
+    carried = []
+    position = 0
+    for old_start, old_count, _, new_count in hunks:
+        # a hunk without old lines is inserted after line old_start
+        old_begin = old_start if old_count == 0 else old_start - 1
+        carried.extend(origins[position:old_begin])
+        carried.extend([None] * new_count)
+        position = old_begin + old_count
+    carried.extend(origins[position:])
+    return carried
+
+
+def to_runs(origins):
+    runs = []
+    for sha in origins:
+        if runs and runs[-1][0] == sha:
+            runs[-1][1] += 1
+        else:
+            runs.append([sha, 1])
+    return runs
+
+
+def from_runs(runs):
+    return [sha for sha, count in runs for _ in range(count)]
+
+
+class LineOriginIndex(object):
+    """
+    The commit that introduced every line of every file version, the answer `git blame` gives,
+    built by one walk over the history from the oldest commit on and stored in a DiskCache.
+
+    Each commit is diffed against its parents (with the blame options and rename detection):
+    lines a commit leaves unchanged keep the origin they had in the parent, the others start with
+    that commit. As git blame does for merges, a line goes to the first parent that has it
+    unchanged, and a file a merge took unchanged from one parent is that parent's version. Lines a
+    merge changed (e.g. resolving a conflict) start with the merge, which git log --no-merges
+    never lists; IndexedBlame leaves those to git log -L.
+
+    Entries are keyed by (path, blob). The same content can reach a path more than once (e.g. a
+    revert) with different origins; such entries keep one variant per commit that produced it,
+    and the variant of a revision is the newest of those commits among its ancestors. Versions
+    the walk cannot attribute (binary files, variants that cannot be told apart) have no origins,
+    callers then run git blame instead. update() only walks the commits added since the last call.
+    """
+
+    def __init__(self, repo, options=(), directory=None, max_bytes=DEFAULT_MAX_BYTES, capacity=DEFAULT_CAPACITY):
+        self.repo = repo
+        self.options = [option for option in options if option in BLAME_DIFF_OPTIONS]
+        self.disk = DiskCache(directory or os.path.join(repo.git_dir, 'line_origin_index'), max_bytes)
+        self.capacity = capacity
+        self.memory = OrderedDict()
+        self._ancestry = {}
+
+    def key(self, *parts):
+        key = '%d %s %s' % (INDEX_VERSION, ' '.join(self.options), ' '.join(parts))
+        return hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def variants(self, path, blob):
+        # [[commit that produced the version, runs of [origin sha, lines] or None]]
+        key = self.key('file', path, blob)
+        variants = self.memory.get(key)
+        if variants is None:
+            text = self.disk.load(key)
+            variants = json.loads(text) if text is not None else []
+        self.remember(key, variants)
+        return variants
+
+    def remember(self, key, variants):
+        self.memory[key] = variants
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def tips(self):
+        text = self.disk.load(self.key('tips'))
+        return json.loads(text) if text is not None else []
+
+    def origins(self, path, rev):
+        """
+        [origin sha] of every line of path as of rev, None if the index cannot tell.
+        """
+        stream = GitStream.of(self.repo)
+        commit_sha = stream.object_id(str(rev) + '^{commit}')
+        blob = stream.object_id(commit_sha + ':' + path) if commit_sha is not None else None
+        if blob is None:
+            return None
+        runs = self.select(self.variants(path, blob), commit_sha)
+        return from_runs(runs) if runs is not None else None
+
+    def select(self, variants, commit_sha):
+        if all(variant[1] == variants[0][1] for variant in variants[1:]):
+            return variants[0][1] if variants else None
+        produced = [variant for variant in variants if self.is_ancestor(variant[0], commit_sha)]
+        for variant in produced:
+            if all(self.is_ancestor(other[0], variant[0]) for other in produced):
+                return variant[1]
+        return None
+
+    def is_ancestor(self, ancestor, sha):
+        key = (ancestor, sha)
+        if key not in self._ancestry:
+            try:
+                self.repo.git.merge_base('--is-ancestor', ancestor, sha)
+                self._ancestry[key] = True
+            except GitCommandError:
+                self._ancestry[key] = False
+        return self._ancestry[key]
+
+    def update(self, rev='HEAD'):
+        """
+        Indexes every commit of rev's history that is not indexed yet, oldest first. Returns the
+        number of commits walked.
+        """
+        head = self.repo.git.rev_parse(rev + '^{commit}')
+        tips = self.tips()
+        revisions = self.repo.git.rev_list('--reverse', '--topo-order', '--parents', head,
+                                           *(['--not'] + tips if tips else []))
+        commits = [line.split(' ') for line in revisions.split('\n') if line]
+        pairs = [(commit[0], parent) for commit in commits for parent in (commit[1:] or [None])]
+        replies = GitStream.of(self.repo).diffs(pairs, *(DIFF_OPTIONS + tuple(self.options)))
+        for commit in commits:
+            sha, parents = commit[0], commit[1:]
+            self.index_commit(sha, parents, [parse_changes(next(replies)) for _ in (parents or [None])])
+        self.disk.store(self.key('tips'), json.dumps([tip for tip in tips if not self.is_ancestor(tip, head)] + [head]))
+        return len(commits)
+
+    def index_commit(self, sha, parents, changes):
+        # changes: parse_changes() of the diff against each parent, in parent order
+        for path, change in changes[0].items():
+            if any(path not in parent_changes for parent_changes in changes[1:]):
+                # taken unchanged from one of the parents, which has it indexed already
+                continue
+            new_blob = change[2]
+            candidates = [(parent, parent_changes[path]) for parent, parent_changes in zip(parents or [None], changes)]
+            # a parent with the same content (e.g. under another name) gets every line
+            same = [candidate for candidate in candidates if candidate[1][1] == new_blob]
+            origins = None
+            for parent, (old_path, old_blob, _, hunks) in same[:1] or candidates:
+                if old_path is None:
+                    parent_origins = []
+                else:
+                    runs = self.select(self.variants(old_path, old_blob), parent)
+                    parent_origins = from_runs(runs) if runs is not None else None
+                if hunks is None or parent_origins is None:
+                    origins = None
+                    break
+                carried = carry(parent_origins, hunks)
+                origins = carried if origins is None else \
+                    [origin if origin is not None else other for origin, other in zip(origins, carried)]
+            runs = to_runs([origin or sha for origin in origins]) if origins is not None else None
+            self.add(path, new_blob, sha, runs)
+
+    def add(self, path, blob, sha, runs):
+        variants = self.variants(path, blob)
+        if any(variant[0] == sha for variant in variants):
+            return
+        variants.append([sha, runs])
+        self.disk.store(self.key('file', path, blob), json.dumps(variants))
@@ -0,0 +1,32 @@
+import csv
+
+
+class RefactoringIndex(object):
+    """
+    Refactored line ranges of refactorings.csv (sha, file, type, begin, end), grouped by
+    (sha, file) so looking up the refactorings of a revision does not scan the whole table.
+    """
+
+    def __init__(self, ranges=None):
+        self.ranges = ranges if ranges is not None else {}
+
+    @classmethod
+    def load(cls, path):
+        ranges = {}
+        with open(path) as fp:
+            for row in csv.DictReader(fp):
+                begin, end = int(row['begin']), int(row['end'])
+                # an empty range marks no line as refactored
+                if begin <= end:
+                    ranges.setdefault((row['sha'], row['file']), []).append((begin, end))
+        return cls(ranges)
+
+    def covers(self, lines, revision, file):
+        # True if every line was part of a refactoring in that revision and file
+        ranges = self.ranges.get((revision, file))
+        if not ranges:
+            return False
+        return all(any(begin <= line <= end for begin, end in ranges) for line in lines)
+
+    def __len__(self):
+        return len(self.ranges)
@@ -0,0 +1,36 @@
+def changed_paths(repo, rev='HEAD'):
+    """
+    {sha: [path]} of the files every commit of rev's history modifies, renames or copies, named as
+    on the bugfix side of its diff, from a single `git log --name-only` call. git log lists no
+    files for merges, so merges are left out.
+    """
+    paths = {}
+    sha = None
+    for line in repo.git.log('--format=commit %H', '--name-only', '-r', '-M', '--diff-filter=MRC', rev).split('\n'):
+        if line.startswith('commit '):
+            sha = line[len('commit '):]
+            paths[sha] = []
+        elif line:
+            paths[sha].append(line)
+    return paths
+
+
+def file_affinity_tasks(commits, shas, paths):
+    """
+    (sha, (path,)) tasks, one per file a commit of shas changes, sorted by path and then by the
+    commit's position in the history. Pool.map hands each worker a run of consecutive tasks, so a
+    worker keeps walking the history of the same file: its git processes read the same pack
+    objects, which the OS still has cached, and its per-process memos (merge checks, index
+    entries) apply again. Commits with no known paths get a single (sha, None) task for all files.
+    """
+    tasks = sorted((path, commits.rows[sha], sha) for sha in shas for path in paths.get(sha, ()))
+    return [(sha, (path,)) for path, _, sha in tasks] + [(sha, None) for sha in shas if not paths.get(sha)]
+
+
+def merge_results(shas, results):
+    # the (sha, blamed shas) results of per-file tasks, as one result per commit in the order of shas
+    merged = {sha: set() for sha in shas}
+    for result in results:
+        if result is not None:
+            merged[result[0]].update(result[1])
+    return [tuple([sha, merged[sha]]) for sha in shas]
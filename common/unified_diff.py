@@ -0,0 +1,181 @@
+import re
+from array import array
+from itertools import compress
+
+HUNK_HEADER_PATTERN = re.compile(r'@@ -([\d]+),?([\d]*) \+([\d]+),?([\d]*) @@')
+
+PARENT_FILENAME_PATTERN = re.compile(r'\-\-\- a/(.*)')
+BUGFIX_FILENAME_PATTERN = re.compile(r'\+\+\+ b/(.*)')
+
+
+class HunkSide(object):
+    """
+    The lines of one side of a hunk as parallel arrays: numbers holds their line numbers on that
+    side, lines the lines as they appear in the diff, the first character being the kind (' ' for
+    context, '-' on the parent side, '+' on the bugfix side).
+    """
+
+    __slots__ = ('numbers', 'lines')
+
+    def __init__(self, numbers, lines):
+        self.numbers = numbers
+        self.lines = lines
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def select(self, keep):
+        # the lines whose flag in keep (one per line) is true
+        return HunkSide(array('l', compress(self.numbers, keep)), list(compress(self.lines, keep)))
+
+
+class Hunk(object):
+    """
+    One @@ hunk of a file diff. lines holds every line after the header as it appears in the diff,
+    its first character the kind (' ', '-', '+', or '\\' for "\\ No newline at end of file").
+    """
+
+    __slots__ = ('header', 'old_start', 'old_count', 'new_start', 'new_count', 'lines', 'unterminated')
+
+    def __init__(self, header):
+        self.header = header
+        match = HUNK_HEADER_PATTERN.match(header)
+        if match is not None:
+            self.old_start, self.old_count, self.new_start, self.new_count = [
+                int(group) if group else 1 for group in match.groups()]
+        else:
+            self.old_start = self.old_count = self.new_start = self.new_count = None
+        self.lines = []
+        # True for the last hunk of a diff that does not end with a newline
+        self.unterminated = False
+
+    @property
+    def change_type(self):
+        # 'm' if the hunk adds and removes lines, 'a' if it only adds, 'd' if it only removes
+        kinds = set(line[:1] for line in self.lines)
+        if '+' in kinds and '-' in kinds:
+            return 'm'
+        if '+' in kinds:
+            return 'a'
+        if '-' in kinds:
+            return 'd'
+        return None
+
+    def sides(self):
+        """
+        (change type, parent side, bugfix side) of the hunk, from a single scan over its lines.
+        """
+        if self.old_start is None:
+            return self.change_type, self.parent_lines(), self.bugfix_lines()
+        old_numbers, old_lines, new_numbers, new_lines = array('l'), [], array('l'), []
+        old, new = self.old_start, self.new_start
+        for line in self.lines:
+            kind = line[:1]
+            if kind == ' ':
+                old_numbers.append(old)
+                old_lines.append(line)
+                new_numbers.append(new)
+                new_lines.append(line)
+                old += 1
+                new += 1
+            elif kind == '-':
+                old_numbers.append(old)
+                old_lines.append(line)
+                old += 1
+            elif kind == '+':
+                new_numbers.append(new)
+                new_lines.append(line)
+                new += 1
+            else:
+                # a "\ No newline at end of file" marker, see _side
+                return self.change_type, self.parent_lines(), self.bugfix_lines()
+        # the lines on one side only are the removed and the added ones
+        context = len(old_lines) + len(new_lines) - len(self.lines)
+        removed, added = len(old_lines) > context, len(new_lines) > context
+        change_type = 'm' if added and removed else 'a' if added else 'd' if removed else None
+        return change_type, HunkSide(old_numbers, old_lines), HunkSide(new_numbers, new_lines)
+
+    def parent_lines(self):
+        # the context and removed lines, numbered as in the parent revision
+        return self._side('-', self.old_start)
+
+    def bugfix_lines(self):
+        # the context and added lines, numbered as in the bugfix revision
+        return self._side('+', self.new_start)
+
+    def _side(self, own_kind, start):
+        # numbered as the regex chain this parser replaced numbered them: the other side's lines are
+        # dropped, numbering stops at the first line that is neither context nor own_kind (a "\ No
+        # newline" marker), and a later line containing a hunk header starts it over
+        lines = [line for line in self.lines if line[:1] not in ('-', '+') or line[:1] == own_kind]
+        numbers, side = array('l'), []
+        number, position = start, 0
+        while True:
+            if number is not None:
+                numbers, side = array('l'), []
+                while position < len(lines) and lines[position][:1] in (' ', own_kind):
+                    numbers.append(number)
+                    side.append(lines[position])
+                    number += 1
+                    position += 1
+            number = None
+            for index in range(position, len(lines)):
+                if index == len(lines) - 1 and self.unterminated:
+                    # a header needs the end of its line
+                    break
+                match = HUNK_HEADER_PATTERN.search(lines[index])
+                if match is not None:
+                    number = int(match.group(4 if own_kind == '+' else 2))
+                    position = index + 1
+                    break
+            if number is None:
+                return HunkSide(numbers, side)
+
+
+class FileDiff(object):
+    """
+    The diff of one file: text runs from its "---" line to the end of its section, the part the
+    file filters match; old_path and new_path are None if the header names no a/ or b/ path.
+    """
+
+    __slots__ = ('text', 'old_path', 'new_path', 'hunks')
+
+    def __init__(self, text, hunks):
+        self.text = text
+        old_path = PARENT_FILENAME_PATTERN.search(text)
+        new_path = BUGFIX_FILENAME_PATTERN.search(text)
+        self.old_path = old_path.group(1) if old_path is not None else None
+        self.new_path = new_path.group(1) if new_path is not None else None
+        self.hunks = hunks
+
+
+def parse_diff(diff):
+    """
+    [FileDiff] of a `git diff` patch, read in a single pass over its lines. Only files with a
+    "---" line are listed (not binary files or pure renames), as the file units always were.
+    """
+    files = []
+    hunks = hunk = None
+    start = position = 0
+    for line in diff.split('\n'):
+        if hunks is None:
+            if line.startswith('---'):
+                hunks = []
+                start = position
+        elif line.startswith('diff'):
+            files.append(FileDiff(diff[start:position], hunks))
+            hunks = hunk = None
+        elif line.startswith('@@ '):
+            hunk = Hunk(line)
+            hunks.append(hunk)
+        elif hunk is not None:
+            hunk.lines.append(line)
+        position += len(line) + 1
+    if hunks is not None:
+        files.append(FileDiff(diff[start:], hunks))
+        if hunk is not None and diff.endswith('\n'):
+            # the empty string after the diff's final newline
+            hunk.lines.pop()
+        elif hunk is not None:
+            hunk.unterminated = True
+    return files
@@ -0,0 +1,173 @@
+import multiprocessing as mp
+import re
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from time import perf_counter
+
+from common.git_stream import GitStream
+
+FILE, LINE = 'file', 'line'
+
+EXCLUDE = ':(exclude)'
+
+
+class UnitFilter(object):
+    """
+    A named filter of file units (matched against FileDiff.text) or line units (each line as it
+    appears in the diff, see HunkSide). Units the pattern is found in are dropped, or with keep=True
+    the only ones kept. A filter with a test instead of a pattern keeps the line units for which
+    test(line number, scope) is true, scope being what the caller passes to FilterSet.lines.
+
+    pathspecs are git pathspecs that keep the files whose path the filter keeps, and at most
+    those, so that git can leave the others out of a diff (see FilterSet.pathspecs).
+    """
+
+    def __init__(self, name, level, pattern=None, keep=False, test=None, pathspecs=()):
+        self.name = name
+        self.level = level
+        self.pattern = re.compile(pattern) if pattern is not None else None
+        self.keep = keep
+        self.test = test
+        self.pathspecs = tuple(pathspecs)
+
+
+def pathspecs_match(pathspecs, path):
+    # whether git diffs path under pathspecs: no exclude matches it, and an include does if there
+    # are any. A pathspec's "*" matches across "/", as fnmatch's does
+    includes = [spec for spec in pathspecs if not spec.startswith(EXCLUDE)]
+    if any(fnmatchcase(path, spec[len(EXCLUDE):]) for spec in pathspecs if spec.startswith(EXCLUDE)):
+        return False
+    return not includes or any(fnmatchcase(path, spec) for spec in includes)
+
+
+# every filter by name, in the order their counters are kept
+REGISTRY = OrderedDict()
+
+
+def register(name, level, pattern=None, keep=False, test=None, pathspecs=()):
+    REGISTRY[name] = UnitFilter(name, level, pattern, keep, test, pathspecs)
+
+
+# the file filters match the "--- a/<path>" line of a file; git matches a pathspec's "*" across "/"
+register('file_creation', FILE, r'--- /dev/null')
+register('testfiles', FILE, r'--- .*/test/.*|--- .*/itests/.*|--- .*/testutils/.*',
+         pathspecs=[':(exclude)%s' % spec for directory in ('test', 'itests', 'testutils')
+                    for spec in (directory + '/*', '*/' + directory + '/*')])
+# leave files ending in .java, .g, .g4 (the pattern keeps any path with ".java" or ".g" in it)
+register('filetypes', FILE, r'--- .*/.*\.java|--- .*/.*\.g|--- .*/.*\.g4', keep=True,
+         pathspecs=['*.java*', '*.g*'])
+
+# line filters match the lines as they appear in the diff, "^" standing for the "<line number> "
+# the lines used to be prefixed with
+register('comments', LINE, r'(?:^|\d+ )[\+\- ] *\/\/.*|(?:^|\d+ )[\+\- ] *\/\*.*|(?:^|\d+ )[\+\- ] *\*.*')
+register('blank_lines', LINE, r'(?:^|\d+ )[\+\- ] *$')
+register('imports', LINE, r'(?:^|\d+ )[\+\- ]import.*')
+# leave the changed lines
+register('context', LINE, r'(?:^|\d+ )[\+\-].*', keep=True)
+# scope: {'refactorings': RefactoringIndex, 'revision': sha, 'file': path}
+register('refactor_changes', LINE,
+         test=lambda number, scope: not scope['refactorings'].covers([number], scope['revision'], scope['file']))
+
+
+def shared_filter_counters():
+    # dropped units and seconds of every registered filter, added to by the pool workers; created
+    # before the pool so workers inherit them
+    return mp.Array('d', 2 * len(REGISTRY))
+
+
+def format_filter_counters(counters):
+    lines = ["unit filters: %-16s %10s %10s" % ("", "dropped", "time [s]")]
+    for index, name in enumerate(REGISTRY):
+        dropped, seconds = counters[2 * index], counters[2 * index + 1]
+        if dropped or seconds:
+            lines.append("              %-16s %10d %10.3f" % (name, dropped, seconds))
+    return '\n'.join(lines)
+
+
+class FilterSet(object):
+    """
+    The filters of one level a run applies, by name, compiled once into a single predicate: a
+    unit is tested against the filters in order and dropped at the first one that drops it, as it
+    was by a stack of filter generators, but in one pass over the units. The units each filter
+    drops and the time spent in it are added to counters (see shared_filter_counters).
+    """
+
+    def __init__(self, names, counters=None):
+        self.filters = [REGISTRY[name] for name in names]
+        self.positions = [list(REGISTRY).index(name) for name in names]
+        self.counters = counters if counters is not None else [0] * (2 * len(REGISTRY))
+
+    def pathspecs(self):
+        """
+        git pathspecs that leave out the files these filters drop by their path, for git to skip
+        them when diffing. Includes of two filters would add up instead of narrowing each other
+        down, so only the first filter with includes has them pushed down. The filters still run
+        on the diff, which they match beyond the path.
+        """
+        pathspecs, includes = [], False
+        for unit_filter in self.filters:
+            filter_includes = [spec for spec in unit_filter.pathspecs if not spec.startswith(EXCLUDE)]
+            pathspecs.extend(spec for spec in unit_filter.pathspecs if spec.startswith(EXCLUDE))
+            if filter_includes and not includes:
+                pathspecs.extend(filter_includes)
+                includes = True
+        return tuple(pathspecs)
+
+    def diff_pathspecs(self, repo, sha, parent):
+        """
+        The arguments ('--' and pathspecs()) to diff sha against parent with, or () if they would
+        change which file units the filters keep. git applies pathspecs before it detects renames,
+        so a file renamed from one side of them to the other would show as a delete or an add
+        only, which --diff-filter=MRC leaves out; such commits are diffed without pathspecs.
+        """
+        pathspecs = self.pathspecs()
+        if not pathspecs:
+            return ()
+        if parent is not None:
+            for old_path, new_path in GitStream.of(repo).renames(sha, parent):
+                # git quotes unusual paths, which are then left to the filters
+                if old_path.startswith('"') or new_path.startswith('"') or \
+                        pathspecs_match(pathspecs, old_path) != pathspecs_match(pathspecs, new_path):
+                    return ()
+        return ('--',) + pathspecs
+
+    def passes(self, text, number, scope, dropped, seconds):
+        start = perf_counter()
+        for index, unit_filter in enumerate(self.filters):
+            if unit_filter.test is not None:
+                kept = unit_filter.test(number, scope)
+            else:
+                kept = (unit_filter.pattern.search(text) is not None) == unit_filter.keep
+            now = perf_counter()
+            seconds[index] += now - start
+            start = now
+            if not kept:
+                dropped[index] += 1
+                return False
+        return True
+
+    def files(self, file_units):
+        # the FileDiffs that pass
+        dropped, seconds = [0] * len(self.filters), [0.0] * len(self.filters)
+        file_units = [file_unit for file_unit in file_units if self.passes(file_unit.text, None, None, dropped, seconds)]
+        self.count(dropped, seconds)
+        return file_units
+
+    def lines(self, side, scope=None):
+        # the lines of a HunkSide that pass, as a HunkSide
+        dropped, seconds = [0] * len(self.filters), [0.0] * len(self.filters)
+        keep = [self.passes(line, number, scope, dropped, seconds) for number, line in zip(side.numbers, side.lines)]
+        self.count(dropped, seconds)
+        return side.select(keep)
+
+    def count(self, dropped, seconds):
+        lock = self.counters.get_lock() if hasattr(self.counters, 'get_lock') else None
+        if lock is not None:
+            lock.acquire()
+        try:
+            for index, position in enumerate(self.positions):
+                self.counters[2 * position] += dropped[index]
+                self.counters[2 * position + 1] += seconds[index]
+        finally:
+            if lock is not None:
+                lock.release()
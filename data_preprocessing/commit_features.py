@@ -1,50 +1,111 @@
-import datetime
-import pytz
+import os, sys
 import re
 import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.issue_store import parse_jira_date, NAT
+from common.git_stream import GitStream
+
+SECONDS_PER_DAY = 86400
+# 1970-01-01 was a thursday
+EPOCH_WEEKDAY = 3
+
+# sha -> commit.stats equivalent, several features read the stats of the same commit
+_STATS = {}
 
 ####################################################
 
 
+def commit_stats(commit):
+    # read from the long-lived git diff-tree process instead of a git process per commit.stats access
+    stats = _STATS.get(commit.hexsha)
+    if stats is None:
+        stats = _STATS[commit.hexsha] = GitStream.of(commit.repo).stats(commit)
+    return stats
+
+
+def prefetch_stats(commits):
+    # pipelines the requests of all commits through one diff-tree process
+    commits = [commit for commit in commits if commit.hexsha not in _STATS]
+    if commits:
+        stats = GitStream.of(commits[0].repo).stats_many(commits)
+        _STATS.update(zip([commit.hexsha for commit in commits], stats))
+
+
 def num_of_insertions(commit):
-    return commit.stats.total['insertions']
+    return commit_stats(commit).total['insertions']
 
 
 def num_of_deletions(commit):
-    return commit.stats.total['deletions']
+    return commit_stats(commit).total['deletions']
 
 
 def num_of_changed_files(commit):
-    return commit.stats.total['files']
+    return commit_stats(commit).total['files']
 
 
 def day_of_week(commit):
-    return commit.committed_datetime.astimezone(pytz.utc).weekday()
+    return day_of_week_from_epoch(commit.committed_date)
 
 
 def hour_of_commit(commit):
-    return commit.committed_datetime.astimezone(pytz.utc).hour
+    return hour_from_epoch(commit.committed_date)
 
 
 def solve_time(commit, jira_issue):
-    committed = commit.committed_datetime.astimezone(pytz.utc)
-    created = datetime.datetime.strptime(jira_issue.fields.created, '%Y-%m-%dT%H:%M:%S.%f%z').astimezone(pytz.utc)
-    delta = committed - created
-    return delta.total_seconds()
+    created, _ = parse_jira_date(jira_issue.fields.created)
+    return solve_time_from_epoch(commit.committed_date, created)
 
 
 def resolution_time(jira_issue):
-    res = jira_issue.fields.resolutiondate
-    cre = jira_issue.fields.created
-
-    if res is not None and cre is not None:
-        resolved = datetime.datetime.strptime(res, '%Y-%m-%dT%H:%M:%S.%f%z').astimezone(pytz.utc)
-        created = datetime.datetime.strptime(cre, '%Y-%m-%dT%H:%M:%S.%f%z').astimezone(pytz.utc)
-        delta = created - resolved
-        return abs(delta.total_seconds())
+    created, _ = parse_jira_date(jira_issue.fields.created)
+    resolved, _ = parse_jira_date(jira_issue.fields.resolutiondate)
+    if created != NAT and resolved != NAT:
+        return resolution_time_from_epoch(created, resolved)
     return None
 
 
+####################################################
+# the same features computed from epoch timestamps (commit dates in seconds, jira dates in
+# milliseconds, see CommitTable and the issue stores); these work on numpy arrays as well
+
+
+def day_of_week_from_epoch(committed):
+    # monday is 0, like datetime.weekday()
+    return (committed // SECONDS_PER_DAY + EPOCH_WEEKDAY) % 7
+
+
+def hour_from_epoch(committed):
+    return committed % SECONDS_PER_DAY // 3600
+
+
+def solve_time_from_epoch(committed, created):
+    return (committed * 1000 - created) / 1000.0
+
+
+def resolution_time_from_epoch(created, resolved):
+    return abs(created - resolved) / 1000.0
+
+
+def time_features(committed, created, resolved):
+    """
+    day_of_week, hour_of_commit, solve_time and resolution_time of many commits at once, from
+    aligned arrays of commit dates and jira creation/resolution dates. Returns one dict per
+    commit; resolution_time is None for unresolved issues.
+    """
+    committed = np.asarray(committed, dtype=np.int64)
+    created = np.asarray(created, dtype=np.int64)
+    resolved = np.asarray(resolved, dtype=np.int64)
+    days = day_of_week_from_epoch(committed)
+    hours = hour_from_epoch(committed)
+    solve_times = solve_time_from_epoch(committed, created)
+    resolution_times = resolution_time_from_epoch(created, resolved)
+    has_resolution = (created != NAT) & (resolved != NAT)
+    return [{"day_of_week": int(d), "hour_of_commit": int(h), "solve_time": float(s),
+             "resolution_time": float(r) if ok else None}
+            for d, h, s, r, ok in zip(days.tolist(), hours.tolist(), solve_times.tolist(), resolution_times.tolist(),
+                                      has_resolution.tolist())]
+
+
 def number_of_comments(jira_issue):
     total = jira_issue.fields.comment.total
     if total is not None:
@@ -127,6 +188,6 @@ def patch_size_rel_variance(jira_issue):
 
 
 def filepath_contains_test(commit):
-    file_paths = list(commit.stats.files.keys())
+    file_paths = list(commit_stats(commit).files.keys())
 
     return int(any(map(lambda x: "test" in x.lower(), file_paths)))
@@ -1,11 +1,12 @@
 from git import Repo
 import os, sys
 from jira import JIRA
-import re
 import csv
-from jira_cache import CachedIssues
 from tqdm import tqdm
 sys.path.append(os.path.dirname(__file__))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.compact_issue_store import load_cached_issues
+from common.commit_table import CommitTable
 import commit_features as cf
 import time
 
@@ -19,38 +20,35 @@ print("Initializing JIRA...")
 options = {'server': 'https://issues.apache.org/jira'}
 jira = JIRA(options=options)
 print("Load cached jira issues...")
-saved_jira_path = "../Enhanced_SZZ/jira/hive/issue_cache.json"
-ISSUES = CachedIssues.load(open(saved_jira_path))
+saved_jira_path = "../Enhanced_SZZ/jira/hive/"
+ISSUES = load_cached_issues(saved_jira_path)
+
+print("Reading commits...")
+# one pass over the history; commits are looked up here instead of creating GitPython objects
+COMMITS = CommitTable.build(repo, repo_name, output_dir_eszz + "jira_keys.csv")
+JIRA_KEYS = COMMITS.jira_keys
 
 def get_jira_id(commit):
-    result = re.search('('+repo_name.upper()+'[-,_]{1}[0-9]+|HADOOP[-,_]{1}[0-9]+)', commit.message, re.IGNORECASE)
-    if result is not None:
-        return result.group(0).replace("_", "-", 1)
-    else:
-        return None
+    return JIRA_KEYS.key_of(commit)
 
 def get_jira_issue(commit):
     jira_id = get_jira_id(commit=commit)
     if jira_id is not None:
-        jira_issues = [issue for issue in ISSUES if issue.key == jira_id]
-        # if the resulting list isn't empty
-        if jira_issues:
-            return jira_issues[0]
-        else:
-            return None
+        return ISSUES.get(jira_id)
     else:
         return None
 
-def get_dictionary(commit, jira_issue):
+def get_dictionary(commit, jira_issue, times):
     d = {}
     d['sha'] = commit.hexsha
     d["num_of_insertions"] = cf.num_of_insertions(commit)
     d["num_of_deletions"] = cf.num_of_deletions(commit)
     d["num_of_changed_files"] = cf.num_of_changed_files(commit)
-    d["day_of_week"] = cf.day_of_week(commit)
-    d["hour_of_commit"] = cf.hour_of_commit(commit)
-    d["solve_time"] = cf.solve_time(commit, jira_issue)
-    d["resolution_time"] = cf.resolution_time(jira_issue)
+    # date features come precomputed for all commits, see cf.time_features
+    d["day_of_week"] = times["day_of_week"]
+    d["hour_of_commit"] = times["hour_of_commit"]
+    d["solve_time"] = times["solve_time"]
+    d["resolution_time"] = times["resolution_time"]
     if d["resolution_time"] is not None:
         d["solve_res_diff"] = abs(d["solve_time"] - d["resolution_time"])
     else:
@@ -72,6 +70,11 @@ def get_dictionary(commit, jira_issue):
 def process_commits(commits, path, labels):
     start = time.time()
     jira_issues = map(get_jira_issue, commits)
+    jira_ids = [get_jira_id(commit) for commit in commits]
+    times = cf.time_features(COMMITS.committed_dates([commit.hexsha for commit in commits]),
+                             ISSUES.timestamps(jira_ids, 'created'),
+                             ISSUES.timestamps(jira_ids, 'resolutiondate'))
+    cf.prefetch_stats(commits)
     columns = ["sha", "num_of_insertions", "num_of_deletions", "num_of_changed_files", "day_of_week", "hour_of_commit",
                "solve_time", "resolution_time", "solve_res_diff", "number_of_comments", "summary", "description",
                "components", "affects_versions", "comments", "number_of_patches", "patch_size_mean",
@@ -82,18 +85,18 @@ def process_commits(commits, path, labels):
         writer = csv.DictWriter(csv_file, fieldnames=columns)
         writer.writeheader()
         if labels is not None:
-            for row, label in tqdm(zip(map(get_dictionary, commits, jira_issues), labels)):
+            for row, label in tqdm(zip(map(get_dictionary, commits, jira_issues, times), labels)):
                 row["label"] = label
                 writer.writerow(row)
         else:
-            for row in tqdm(map(get_dictionary, commits, jira_issues)):
+            for row in tqdm(map(get_dictionary, commits, jira_issues, times)):
                 writer.writerow(row)
     end = time.time()
     print("Time elapsed: ", (end - start))
 
 
 def get_commits_from_shas(shas):
-    return [repo.commit(sha) for sha in shas]
+    return COMMITS.commits(shas)
 
 # Processing E-SZZ generated commits
 with open(output_dir_eszz + "sha_label_eszz.csv", "r") as csv_file:
@@ -101,7 +104,7 @@ with open(output_dir_eszz + "sha_label_eszz.csv", "r") as csv_file:
     commits = []
     labels = []
     for row in reader:
-        commit = repo.commit(row["sha"])
+        commit = COMMITS.commit(row["sha"])
         if get_jira_issue(commit) is not None:
             commits.append(commit)
             labels.append(row["label"])
@@ -115,7 +118,7 @@ with open(output_dir_szz + "sha_label_szz.csv", "r") as csv_file:
     commits = []
     labels = []
     for row in reader:
-        commit = repo.commit(row["sha"])
+        commit = COMMITS.commit(row["sha"])
         if get_jira_issue(commit) is not None:
             commits.append(commit)
             labels.append(row["label"])
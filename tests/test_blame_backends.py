@@ -0,0 +1,97 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from git import Repo
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.blame import IndexedBlame, LineLog, PorcelainBlame
+from common.commit_table import CommitTable
+
+# the blame options of the E-SZZ scripts
+ESZZ_OPTIONS = ('--no-merges', '--ignore-cr-at-eol', '--ignore-space-at-eol', '--ignore-blank-lines',
+                '--ignore-space-change')
+
+LINES = ['    int field%d = %d;' % (i, i) for i in range(12)]
+
+
+class MergeHistoryTest(unittest.TestCase):
+    """
+    The blame and index backends against git log -L (the log backend) on a history with a merge
+    that changes the blamed lines: a conflict resolved to new text, and a line only the merge
+    changed.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+        self.git('init', '-q')
+        self.git('config', 'user.email', 'szz@example.com')
+        self.git('config', 'user.name', 'szz')
+        self.git('checkout', '-q', '-b', 'main')
+        self.commit(LINES, 'initial')
+        self.git('checkout', '-q', '-b', 'side')
+        self.commit(self.changed({3: 'side'}), 'side')
+        self.git('checkout', '-q', 'main')
+        self.commit(self.changed({3: 'main', 9: 'main'}), 'main')
+        subprocess.run(['git', 'merge', '-q', 'side'], cwd=self.path, stdout=subprocess.DEVNULL)
+        self.commit(self.changed({3: 'resolved', 9: 'main', 6: 'merge only'}), 'merge side')
+        # the merge is older than the revision blamed
+        self.commit(self.changed({3: 'resolved', 9: 'main', 6: 'merge only', 11: 'later'}), 'later')
+        self.commit(self.changed({3: 'fixed', 9: 'main', 6: 'fixed', 1: 'fixed', 11: 'later'}), 'fix')
+        self.repo = Repo(self.path)
+        self.commits = CommitTable.build(self.repo)
+
+    def tearDown(self):
+        self.repo.close()
+        self.directory.cleanup()
+
+    def git(self, *args):
+        subprocess.run(['git'] + list(args), cwd=self.path, check=True, stdout=subprocess.DEVNULL)
+
+    def changed(self, changes):
+        return [line if i not in changes else '    int field%d = %d; // %s' % (i, i, changes[i])
+                for i, line in enumerate(LINES)]
+
+    def commit(self, lines, message):
+        with open(os.path.join(self.path, 'A.java'), 'w') as fp:
+            fp.write('\n'.join(lines) + '\n')
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', message)
+
+    def histories(self, backend, rev):
+        return [(line, list(shas)) for line, shas in backend.file_histories([(1, len(LINES))], 'A.java', rev)]
+
+    def assert_same_histories(self, options):
+        log = LineLog(self.repo, self.commits, options)
+        blame = PorcelainBlame(self.repo, self.commits, options)
+        index = IndexedBlame(self.repo, self.commits, options, index_dir=os.path.join(self.path, 'index'))
+        index.index.update()
+        for rev in ('HEAD', 'HEAD^'):
+            expected = self.histories(log, rev)
+            self.assertEqual(self.histories(blame, rev), expected)
+            self.assertEqual(self.histories(index, rev), expected)
+
+    def test_merge_is_a_merge(self):
+        self.assertEqual(len(self.commits.parents[self.commits.rows[self.repo.commit('HEAD~2').hexsha]]), 2)
+
+    def test_eszz_options(self):
+        self.assert_same_histories(ESZZ_OPTIONS)
+
+    def test_szz_options(self):
+        self.assert_same_histories(())
+
+    def test_eszz_blamed_commits(self):
+        # what E-SZZ takes from each line of the bugfix's parent: the first commit other than the bugfix
+        merge = self.repo.commit('HEAD~2').hexsha
+        index = IndexedBlame(self.repo, self.commits, ESZZ_OPTIONS, index_dir=os.path.join(self.path, 'index'))
+        index.index.update()
+        for backend in (PorcelainBlame(self.repo, self.commits, ESZZ_OPTIONS), index):
+            blamed = [next(iter(shas)) for _, shas in backend.file_histories([(4, 1), (7, 1)], 'A.java', 'HEAD^')]
+            self.assertNotIn(merge, blamed)
+
+
+if __name__ == '__main__':
+    unittest.main()
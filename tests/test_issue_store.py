@@ -0,0 +1,46 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.issue_store import IssueStore, normalize_key
+from common.jira_keys import extract_jira_key, jira_key_pattern
+
+
+class _Issue(object):
+
+    def __init__(self, key):
+        self.key = key
+
+
+class JiraKeyMatchingTest(unittest.TestCase):
+    """Commit messages link to issues by the rules the scripts always used, see normalize_key."""
+
+    def setUp(self):
+        self.store = IssueStore([_Issue('HIVE-123'), _Issue('HADOOP-7')])
+        self.pattern = jira_key_pattern('hive')
+
+    def linked_issue(self, message):
+        issue = self.store.get(extract_jira_key(message, self.pattern))
+        return issue.key if issue is not None else None
+
+    def test_normalize_key(self):
+        self.assertEqual(normalize_key('HIVE_123'), 'HIVE-123')
+        self.assertEqual(normalize_key('hive_123'), 'hive-123')
+        self.assertEqual(normalize_key('HIVE,123'), 'HIVE,123')
+
+    def test_linked_messages(self):
+        self.assertEqual(self.linked_issue('HIVE-123: fix NPE'), 'HIVE-123')
+        self.assertEqual(self.linked_issue('HIVE_123 fix NPE'), 'HIVE-123')
+        self.assertEqual(self.linked_issue('backport HADOOP-7'), 'HADOOP-7')
+
+    def test_unlinked_messages(self):
+        # the pattern finds these, but their key is not the issue's
+        self.assertIsNone(self.linked_issue('hive-123: fix NPE'))
+        self.assertIsNone(self.linked_issue('hive_123 fix NPE'))
+        self.assertIsNone(self.linked_issue('HIVE,123 fix NPE'))
+        self.assertIsNone(self.linked_issue('no issue'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.jira_fetch import append_to_journal
+from common.jira_sync import sync_issues, CACHE_FILE, JOURNAL_FILE
+
+
+def raw_issue(number, updated):
+    return {'key': 'HIVE-%d' % number, 'fields': {'updated': updated}}
+
+
+class TornJournalTest(unittest.TestCase):
+    """A sync killed while journaling a page resumes, instead of failing to merge the journal."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.jira_path = self.directory.name
+        self.journal_path = os.path.join(self.jira_path, JOURNAL_FILE)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_torn_journal(self, complete, torn):
+        with open(self.journal_path, 'w') as fp:
+            for issue in complete:
+                fp.write(json.dumps(issue) + '\n')
+            fp.write(json.dumps(torn)[:20])
+
+    def test_append_cuts_torn_line(self):
+        first, second = raw_issue(1, '2016-01-01T10:00:00.000+0000'), raw_issue(2, '2016-01-01T11:00:00.000+0000')
+        self.write_torn_journal([first], second)
+        append_to_journal(self.journal_path, [second])
+        with open(self.journal_path) as fp:
+            self.assertEqual([json.loads(line) for line in fp], [first, second])
+
+    def test_append_cuts_journal_of_one_torn_line(self):
+        issue = raw_issue(1, '2016-01-01T10:00:00.000+0000')
+        self.write_torn_journal([], issue)
+        append_to_journal(self.journal_path, [issue])
+        with open(self.journal_path) as fp:
+            self.assertEqual([json.loads(line) for line in fp], [issue])
+
+    def test_resumed_sync(self):
+        cached = raw_issue(1, '2016-01-01T10:00:00.000+0000')
+        with open(os.path.join(self.jira_path, CACHE_FILE), 'w') as fp:
+            json.dump([cached], fp)
+        page = [raw_issue(2, '2016-01-02T10:00:00.000+0000'), raw_issue(3, '2016-01-02T11:00:00.000+0000')]
+        # killed while writing the page's second issue, before its checkpoint
+        self.write_torn_journal(page[:1], page[1])
+        pages = [page, []]
+        fetched = sync_issues(None, 'HIVE', self.jira_path, fetch=lambda jira, jql, start_at, page_size: pages.pop(0))
+        self.assertEqual(fetched, 2)
+        with open(os.path.join(self.jira_path, CACHE_FILE)) as fp:
+            self.assertEqual(sorted(issue['key'] for issue in json.load(fp)), ['HIVE-1', 'HIVE-2', 'HIVE-3'])
+        self.assertFalse(os.path.isfile(self.journal_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from git import Repo
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.git_stream import GitStream
+from common.unified_diff import parse_diff
+from common.unit_filters import FilterSet, pathspecs_match
+
+FILE_FILTERS = ["testfiles", "filetypes"]
+
+JAVA = ''.join('    int field%d = %d;\n' % (i, i) for i in range(40))
+
+
+class DiffPathspecsTest(unittest.TestCase):
+    """The file units left by the pushed-down pathspecs against those of the file filters alone."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+        self.git('init', '-q')
+        self.git('config', 'user.email', 'szz@example.com')
+        self.git('config', 'user.name', 'szz')
+        self.write('src/X.java', JAVA)
+        self.write('src/Y.java', JAVA)
+        self.write('src/Foo.java', JAVA)
+        self.write('src/test/T.java', JAVA)
+        self.commit('initial')
+        self.repo = Repo(self.path)
+        self.filters = FilterSet(FILE_FILTERS)
+
+    def tearDown(self):
+        self.repo.close()
+        self.directory.cleanup()
+
+    def git(self, *args):
+        subprocess.run(['git'] + list(args), cwd=self.path, check=True, stdout=subprocess.DEVNULL)
+
+    def write(self, filename, text):
+        path = os.path.join(self.path, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fp:
+            fp.write(text)
+
+    def commit(self, message):
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', message)
+
+    def rename(self, old, new):
+        # a rename with edits, still similar enough for git to detect it
+        os.makedirs(os.path.dirname(os.path.join(self.path, new)), exist_ok=True)
+        self.git('mv', old, new)
+        self.write(new, JAVA.replace('field3 = 3', 'field3 = 33'))
+
+    def file_units(self, pathspecs):
+        head = self.repo.head.commit
+        diff = GitStream.of(self.repo).diff(head.hexsha, head.parents[0].hexsha, '--diff-filter=MRC', *pathspecs)
+        return [file_unit.old_path for file_unit in self.filters.files(parse_diff(diff))]
+
+    def diff_pathspecs(self):
+        head = self.repo.head.commit
+        return self.filters.diff_pathspecs(self.repo, head.hexsha, head.parents[0].hexsha)
+
+    def test_modified_files(self):
+        self.write('src/Y.java', JAVA.replace('field1 = 1', 'field1 = 11'))
+        self.write('src/test/T.java', JAVA.replace('field1 = 1', 'field1 = 11'))
+        self.commit('modify')
+        self.assertEqual(self.diff_pathspecs(), ('--',) + self.filters.pathspecs())
+        self.assertEqual(self.file_units(self.diff_pathspecs()), ['src/Y.java'])
+        self.assertEqual(self.file_units(()), ['src/Y.java'])
+
+    def test_rename_into_excluded_directory(self):
+        self.rename('src/X.java', 'test/X.java')
+        self.commit('move into test')
+        # git would only see the delete of src/X.java, which --diff-filter=MRC leaves out
+        self.assertEqual(self.file_units(('--',) + self.filters.pathspecs()), [])
+        self.assertEqual(self.diff_pathspecs(), ())
+        self.assertEqual(self.file_units(self.diff_pathspecs()), self.file_units(()))
+        self.assertEqual(self.file_units(()), ['src/X.java'])
+
+    def test_rename_to_other_file_type(self):
+        self.rename('src/Foo.java', 'src/Foo.txt')
+        self.commit('rename to txt')
+        self.assertEqual(self.diff_pathspecs(), ())
+        self.assertEqual(self.file_units(self.diff_pathspecs()), self.file_units(()))
+        self.assertEqual(self.file_units(()), ['src/Foo.java'])
+
+    def test_rename_within_pathspecs(self):
+        self.rename('src/X.java', 'src/Z.java')
+        self.commit('rename')
+        self.assertEqual(self.diff_pathspecs(), ('--',) + self.filters.pathspecs())
+        self.assertEqual(self.file_units(self.diff_pathspecs()), ['src/X.java'])
+
+
+class PathspecsMatchTest(unittest.TestCase):
+
+    def test_file_filter_pathspecs(self):
+        pathspecs = FilterSet(FILE_FILTERS).pathspecs()
+        self.assertTrue(pathspecs_match(pathspecs, 'ql/src/java/Driver.java'))
+        self.assertTrue(pathspecs_match(pathspecs, 'Driver.java'))
+        self.assertTrue(pathspecs_match(pathspecs, 'parser/HiveParser.g'))
+        self.assertFalse(pathspecs_match(pathspecs, 'ql/src/test/Driver.java'))
+        self.assertFalse(pathspecs_match(pathspecs, 'test/Driver.java'))
+        self.assertFalse(pathspecs_match(pathspecs, 'itests/a/b/Driver.java'))
+        self.assertFalse(pathspecs_match(pathspecs, 'README.txt'))
+
+
+if __name__ == '__main__':
+    unittest.main()